@@ -3,6 +3,9 @@ from PyQt6.QtWidgets import QApplication
 from models.model import Model
 from controllers.main_ctrl import MainController
 from controllers.render import RenderInput
+from models.flow_cache import FlowCache
+from models.frame_cache import FrameCache
+from osvos.weights_cache import WeightsCache
 from views.main_view import MainView
 
 
@@ -10,7 +13,9 @@ class App(QApplication):
     def __init__(self, sys_argv):
         super(App, self).__init__(sys_argv)
         self.model = Model()
-        self.main_controller = MainController(self.model)
+        self.main_controller = MainController(
+            self.model, frame_cache=FrameCache(), flow_cache=FlowCache(), osvos_cache=WeightsCache()
+        )
         self.main_view = MainView(self.model, self.main_controller)
         self.main_view.show()
 
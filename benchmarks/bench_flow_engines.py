@@ -0,0 +1,49 @@
+"""Time and accuracy of every flow engine preset on a synthetic 1080p frame pair.
+
+The previous frame is the current one shifted by a known displacement, so the
+mean end-point error (EPE) against that displacement measures quality.
+Run from the repository root:
+
+    python -m benchmarks.bench_flow_engines
+"""
+import timeit
+
+import cv2
+import numpy as np
+
+from controllers.optical_flow import FLOW_ENGINES, FLOW_SCALES
+
+SHIFT = (3, -2)  # (dx, dy) from a pixel of the current frame to the previous one
+
+
+def synthetic_pair(height=1080, width=1920, seed=0):
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 256, size=(height, width), dtype=np.uint8)
+    curr = cv2.GaussianBlur(noise, (0, 0), 3)
+    curr = cv2.normalize(curr, None, 0, 255, cv2.NORM_MINMAX)
+    dx, dy = SHIFT
+    prev = np.roll(curr, shift=(dy, dx), axis=(0, 1))
+    return curr, prev
+
+
+def main():
+    curr, prev = synthetic_pair()
+    border = 32
+    expected = np.array(SHIFT, dtype=np.float32)
+
+    cv2.setNumThreads(1)
+    print(f"frame: {curr.shape[1]}x{curr.shape[0]}, single thread")
+    print(f"{'engine':<12}{'preset':<12}{'scale':<8}{'ms/frame':>10}{'EPE px':>10}")
+    for engine_name, presets in FLOW_ENGINES.items():
+        for preset, engine in presets.items():
+            for scale, downscale in FLOW_SCALES.items():
+                scaled = engine.scaled(downscale)
+                flow = scaled(curr, prev)
+                seconds = min(timeit.repeat(lambda: scaled(curr, prev), number=1, repeat=3))
+                inner = flow[border:-border, border:-border]
+                epe = np.linalg.norm(inner - expected, axis=-1).mean()
+                print(f"{engine_name:<12}{preset:<12}{scale:<8}{seconds * 1000:>10.1f}{epe:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
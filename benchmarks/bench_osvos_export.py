@@ -0,0 +1,53 @@
+"""CPU inference speed of the OSVOS export presets against the eager network.
+
+Uses a randomly initialised network (Kaiming-initialised so the masks are not empty);
+compile time, steady-state frames/s and the lowest per-label mask IoU with the eager
+network, on frames the graph was not calibrated on, are reported per preset. Run from the repository root:
+
+    python -m benchmarks.bench_osvos_export
+"""
+import timeit
+
+import torch
+
+import osvos.vgg_osvos as vo
+from osvos.export import EXPORTS, parity
+
+BATCH = 4
+HEIGHT, WIDTH = 240, 432
+THRESHOLD = 0.5
+
+
+def main():
+    torch.manual_seed(0)
+    net = vo.OSVOS(pretrained=0).eval()
+    for m in net.modules():
+        if isinstance(m, torch.nn.Conv2d):
+            torch.nn.init.kaiming_normal_(m.weight)
+    net = net.to(memory_format=torch.channels_last)
+    inputs = (50 * torch.randn(BATCH, 3, HEIGHT, WIDTH)).contiguous(memory_format=torch.channels_last)
+    with torch.inference_mode():
+        expected = net.forward_fused(inputs)
+
+    print(f"batches of {BATCH} at {WIDTH}x{HEIGHT}, {torch.get_num_threads()} torch threads")
+    print(f"{'export':<20}{'compile s':>10}{'frames/s':>10}{'IoU':>12}")
+    for name, export in EXPORTS.items():
+        start = timeit.default_timer()
+        graph = net if export is None else export.compile(net, inputs, expected, THRESHOLD)
+        compile_seconds = timeit.default_timer() - start
+        if graph is None:
+            print(f"{name:<20}{'failed':>10}")
+            continue
+
+        def run():
+            with torch.inference_mode():
+                graph.forward_fused(inputs)
+
+        run()  # TorchScript optimises the graph on its first runs
+        seconds = min(timeit.repeat(run, number=1, repeat=3))
+        iou, _ = parity(expected[1:], graph, inputs[1:], THRESHOLD)
+        print(f"{name:<20}{compile_seconds:>10.1f}{BATCH / seconds:>10.2f}{iou:>12.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Training speed and mask quality of OSVOS fine-tuning with the first k VGG stages frozen.
+
+Uses the synthetic clip of `bench_osvos_schedule`; every k gets the same number of
+training steps. Needs the parent model (see `OSVOS_PARENT_MODEL`). Run from the
+repository root:
+
+    python -m benchmarks.bench_osvos_frozen_stages
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+
+import osvos.main as osvos_main
+from benchmarks.bench_osvos_schedule import HEIGHT, NUM_TEST, WIDTH, iou, synthetic_clip
+from osvos.model_manager import default_manager
+from osvos.schedule import Schedule
+
+STEPS = 50
+
+
+def main():
+    manager = default_manager()
+    if not os.path.exists(manager.parent_model_path):
+        sys.exit("parent model not found at %s; set OSVOS_PARENT_MODEL" % manager.parent_model_path)
+
+    frames, masks = synthetic_clip()
+    gt = osvos_main.label_channels(masks[0], [1])
+
+    print("frame: %dx%d, %d steps, %d test frames, device %s" % (WIDTH, HEIGHT, STEPS, NUM_TEST, manager.device))
+    print("%-8s%12s%10s" % ("frozen", "steps/s", "IoU"))
+    for frozen_stages in range(len(manager.parent().stages)):
+        net = manager.clone()
+        schedule = Schedule(max_epochs=STEPS, frozen_stages=frozen_stages)
+        start = timeit.default_timer()
+        osvos_main.train_online(net, frames[0], gt, manager.device, schedule, 1, 0, 3e-8, 0.0002 / 3)
+        seconds = timeit.default_timer() - start
+        predicted = list(osvos_main.predict(net, frames[1:], manager.device))
+        score = np.mean([iou(p, m) for p, m in zip(predicted, masks[1:])])
+        print("%-8d%12.2f%10.3f" % (frozen_stages, STEPS / seconds, score))
+
+
+if __name__ == "__main__":
+    main()
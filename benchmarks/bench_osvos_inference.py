@@ -0,0 +1,64 @@
+"""CPU throughput of OSVOS mask prediction: the old per-frame loop vs. batched `predict`.
+
+Uses a randomly initialised network, so only speed and agreement of the masks
+are meaningful. Run from the repository root:
+
+    python -m benchmarks.bench_osvos_inference
+"""
+import timeit
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+import osvos.custom_transforms as tr
+import osvos.davis_2016 as db
+import osvos.vgg_osvos as vo
+from osvos.main import predict
+
+NUM_FRAMES = 16
+HEIGHT, WIDTH = 240, 432
+THRESHOLD = 0.5
+
+
+def per_frame_loop(net, images):
+    """The prediction loop `osvos.main.run` used before batching."""
+    db_test = db.DAVIS2016(train=False, img_list=images, labels=[None] * len(images), transform=tr.ToTensor())
+    testloader = DataLoader(db_test, batch_size=1, shuffle=False, num_workers=0)
+    masks = []
+    with torch.no_grad():
+        for sample_batched in testloader:
+            outputs = net.forward(sample_batched["image"])
+            for jj in range(int(outputs[-1].size()[0])):
+                pred = np.transpose(outputs[-1].cpu().data.numpy()[jj, :, :, :], (1, 2, 0))
+                pred = 1 / (1 + np.exp(-pred))
+                masks.append((np.squeeze(pred) > THRESHOLD).astype(np.uint8))
+    return masks
+
+
+def main():
+    torch.manual_seed(0)
+    net = vo.OSVOS(pretrained=0).eval()
+    # the default initialisation leaves every logit next to zero; give the masks some structure
+    for m in net.modules():
+        if isinstance(m, torch.nn.Conv2d):
+            torch.nn.init.kaiming_normal_(m.weight)
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, size=(HEIGHT, WIDTH, 3), dtype=np.uint8) for _ in range(NUM_FRAMES)]
+    device = torch.device("cpu")
+
+    print(f"{NUM_FRAMES} frames of {WIDTH}x{HEIGHT}, {torch.get_num_threads()} torch threads")
+    seconds = min(timeit.repeat(lambda: per_frame_loop(net, images), number=1, repeat=2))
+    reference = per_frame_loop(net, images)
+    print(f"{'per-frame loop':<20}{NUM_FRAMES / seconds:>8.2f} frames/s")
+
+    for batch_size in (1, 4, 8):
+        run = lambda: list(predict(net, images, device, batch_size, THRESHOLD))
+        seconds = min(timeit.repeat(run, number=1, repeat=2))
+        masks = run()
+        agree = np.mean([np.mean(a == b) for a, b in zip(masks, reference)])
+        print(f"{'predict, batch %d' % batch_size:<20}{NUM_FRAMES / seconds:>8.2f} frames/s  agreement {agree:.4%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Mask IoU against fine-tuning time for the OSVOS training schedules.
+
+A synthetic clip (a textured ellipse drifting over a textured background) is
+annotated on its first frame; each schedule fine-tunes the parent network on that
+frame and the masks predicted for the following frames are scored against the
+true ellipse. Needs the parent model (see `OSVOS_PARENT_MODEL`). Run from the
+repository root:
+
+    python -m benchmarks.bench_osvos_schedule
+"""
+import os
+import sys
+import timeit
+
+import cv2
+import numpy as np
+
+import osvos.main as osvos_main
+from osvos.model_manager import default_manager
+from osvos.schedule import SCHEDULES, Schedule
+
+HEIGHT, WIDTH = 240, 432
+NUM_TEST = 8
+STEP = (4, 2)  # (dx, dy) drift of the object per frame
+
+
+def texture(rng, height, width, sigma):
+    noise = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    return cv2.normalize(cv2.GaussianBlur(noise, (0, 0), sigma), None, 0, 255, cv2.NORM_MINMAX)
+
+
+def synthetic_clip(seed=0):
+    rng = np.random.default_rng(seed)
+    background = texture(rng, HEIGHT, WIDTH, 6)
+    foreground = texture(rng, HEIGHT, WIDTH, 2)
+    frames, masks = [], []
+    for t in range(NUM_TEST + 1):
+        mask = np.zeros((HEIGHT, WIDTH), np.uint8)
+        center = (WIDTH // 3 + STEP[0] * t, HEIGHT // 2 + STEP[1] * t)
+        cv2.ellipse(mask, center, (WIDTH // 8, HEIGHT // 5), 20, 0, 360, 1, -1)
+        frames.append(np.where(mask[..., None] == 1, foreground, background))
+        masks.append(mask)
+    return frames, masks
+
+
+def iou(a, b):
+    union = np.logical_or(a, b).sum()
+    return np.logical_and(a, b).sum() / union if union else 1.0
+
+
+def main():
+    manager = default_manager()
+    if not os.path.exists(manager.parent_model_path):
+        sys.exit("parent model not found at %s; set OSVOS_PARENT_MODEL" % manager.parent_model_path)
+
+    frames, masks = synthetic_clip()
+    img, truth = frames[0], masks[0]
+    gt = osvos_main.label_channels(truth, [1])
+
+    schedules = dict(SCHEDULES)
+    for epochs in (25, 50, 100):
+        schedules["%d epochs" % epochs] = Schedule(max_epochs=epochs)
+
+    results = []
+    for name, schedule in schedules.items():
+        net = manager.clone()
+        start = timeit.default_timer()
+        tracker = osvos_main.train_online(net, img, gt, manager.device, schedule, 1, 0, 3e-8, 0.0002 / 3)
+        seconds = timeit.default_timer() - start
+        predicted = list(osvos_main.predict(net, frames[1:], manager.device))
+        score = np.mean([iou(p, m) for p, m in zip(predicted, masks[1:])])
+        results.append((name, seconds, tracker, score))
+
+    print("frame: %dx%d, %d test frames, device %s" % (WIDTH, HEIGHT, NUM_TEST, manager.device))
+    print("%-12s%10s%8s  %-14s%8s" % ("schedule", "train s", "epochs", "stopped on", "IoU"))
+    for name, seconds, tracker, score in results:
+        print("%-12s%10.1f%8d  %-14s%8.3f" % (name, seconds, tracker.epoch, tracker.reason, score))
+
+
+if __name__ == "__main__":
+    main()
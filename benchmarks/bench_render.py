@@ -0,0 +1,144 @@
+"""Render time and peak memory on a synthetic 1080p frame: a pan at each zoom level, and
+the label overlay (colorisation and alpha blend) alone. Times include painting the image
+frame. Last, how many renders a simulated one-second mouse drag causes.
+
+Renders through the real Model / MainController / MainView on Qt's offscreen platform;
+the full-frame zoom (np.repeat, then float32) and the float64 overlay the renderer used
+before are timed for comparison. Run from the repository root:
+
+    python -m benchmarks.bench_render
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+import numpy as np
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6 import QtWidgets
+
+from controllers.main_ctrl import MainController
+from controllers.render import RenderInput
+from models.label_volume import LabelVolume
+from models.model import Model
+from views.main_view import MainView
+
+HEIGHT, WIDTH = 1080, 1920
+WINDOW = (1280, 800)
+ZOOMS = [-10, -4, -2, 1, 2, 4, 10]
+
+
+def zoom_full_frame(img, ratio):
+    # the zoom previously done by Render._zoom, on the whole frame
+    if ratio > 1:
+        img = np.repeat(img, ratio, axis=0)
+        img = np.repeat(img, ratio, axis=1)
+    elif ratio < -1:
+        step = int(-ratio)
+        img = img[step // 2::step, step // 2::step]
+    return np.float32(img)
+
+
+def overlay_float64(image, label, alpha):
+    # the colorisation and blend previously done by Render._label_move_and_apply
+    label_image = np.zeros((*label.shape, 3))
+    label_image[label == -1] = [255, 255, 255]
+    label_image[label == 1] = [0, 0, 255]
+    label_image[label == 2] = [0, 255, 0]
+    label_image[label == 3] = [255, 0, 0]
+    return (image * (1 - alpha) + label_image * alpha).astype("uint8")
+
+
+def peak_bytes(func):
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    app = QtWidgets.QApplication(sys.argv)
+    model = Model()
+    controller = MainController(model)
+    view = MainView(model, controller)
+    view.resize(*WINDOW)
+    view.show()
+    app.processEvents()
+
+    rng = np.random.default_rng(0)
+    frames = rng.integers(0, 256, size=(1, HEIGHT, WIDTH, 3), dtype=np.uint8)
+    model.video_data = frames
+    controller.prefetcher.reset()
+    label = LabelVolume(1, HEIGHT, WIDTH)
+    label[0] = rng.integers(0, 4, size=(HEIGHT, WIDTH), dtype=np.uint8)
+    model.video_label = label
+    model.frame_num = 0
+    scheduler = controller.render_scheduler
+
+    image_frame = view._ui.image_frame
+    print(f"frame: {WIDTH}x{HEIGHT}, window: {WINDOW[0]}x{WINDOW[1]}")
+    print(f"{'zoom':>6}{'pan ms':>10}{'pan peak MB':>14}{'full-frame zoom ms':>20}{'MB':>10}")
+    for zoom in ZOOMS:
+        model.zoom_ratio = zoom
+        pans = iter(range(10**6))
+
+        def pan():
+            model.coordinates = (next(pans) % 7, 0)
+            scheduler.flush()
+            image_frame.repaint()
+
+        pan_time = min(timeit.repeat(pan, number=1, repeat=10))
+        pan_peak = peak_bytes(pan)
+        full = lambda: zoom_full_frame(frames[0], zoom)
+        full_time = min(timeit.repeat(full, number=1, repeat=3))
+        full_peak = peak_bytes(full)
+        print(
+            f"{zoom:>6}{pan_time * 1000:>10.1f}{pan_peak / 1024**2:>14.1f}"
+            f"{full_time * 1000:>20.1f}{full_peak / 1024**2:>10.1f}"
+        )
+
+    # overlay only: a label edit reruns colorisation, an alpha change only repaints
+    model.zoom_ratio = 1
+    alphas = iter(range(10**6))
+
+    def label_redraw():
+        controller.render([RenderInput.LABEL_COLOR])
+        scheduler.flush()
+        image_frame.repaint()
+
+    def alpha_change():
+        model.alpha = 40 + next(alphas) % 2 * 10
+        image_frame.repaint()
+
+    label_time = min(timeit.repeat(label_redraw, number=1, repeat=10))
+    alpha_time = min(timeit.repeat(alpha_change, number=1, repeat=10))
+    image = model.render_data.zoomed_image
+    zoomed_label = model.render_data.zoomed_label
+    old = lambda: overlay_float64(image, zoomed_label, 0.5)
+    old_time = min(timeit.repeat(old, number=1, repeat=10))
+    label_peak = peak_bytes(label_redraw)
+    print(f"\noverlay per frame, {image.shape[1]}x{image.shape[0]}:")
+    print(f"label redraw:         {label_time * 1000:8.1f} ms  (peak {label_peak / 1024**2:.1f} MB)")
+    print(f"alpha change:         {alpha_time * 1000:8.1f} ms")
+    print(f"float64 colour+blend: {old_time * 1000:8.1f} ms  (peak {peak_bytes(old) / 1024**2:.1f} MB)")
+
+    # a drag: mouse moves as fast as the event loop takes them, each one moving the view
+    scheduler.flush()
+    before = scheduler.stats()
+    start = timeit.default_timer()
+    moves = 0
+    while timeit.default_timer() - start < 1:
+        model.coordinates = (moves % 7, 0)
+        moves += 1
+        app.processEvents()
+    scheduler.flush()
+    stats = {key: value - before[key] for key, value in scheduler.stats().items()}
+    print(f"\n1 s drag: {moves} moves, {stats['renders']} renders, {stats['merged']} merged, {stats['dropped']} dropped")
+    print(f"display interval {scheduler.interval * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
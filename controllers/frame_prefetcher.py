@@ -0,0 +1,142 @@
+import threading
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Hashable
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from models.model import Model
+
+
+class LRUCache:
+    """Thread-safe LRU of numpy arrays bounded by total bytes, with hit/miss counters."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict[Hashable, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, count=True) -> np.ndarray | None:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            if count:
+                if value is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return value
+
+    def put(self, key, value: np.ndarray) -> np.ndarray:
+        """Cache `value` under `key` and return the cached array.
+
+        A view (e.g. a frame of a decoded chunk) is copied first, so the cache never keeps
+        a larger buffer alive than the bytes it counts.
+        """
+        if value.nbytes > self.max_bytes:
+            return value
+        if value.base is not None:
+            value = np.array(value)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._items[key] = value
+            self.nbytes += value.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "items": len(self), "bytes": self.nbytes}
+
+
+class FramePrefetcher:
+    """Caches decoded frames, prefetching ahead of frame navigation.
+
+    `navigate` queues the next `lookahead` frames in the direction of travel for a
+    background thread; reversing direction drops whatever is still queued.
+    """
+
+    def __init__(
+        self,
+        model: "Model",
+        frame_budget: int = 256 * 1024**2,
+        lookahead: int = 8,
+    ):
+        self._model = model
+        self.frames = LRUCache(frame_budget)
+        self.lookahead = lookahead
+
+        self._queue: deque[int] = deque()
+        self._epoch = 0
+        self._cond = threading.Condition()
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def reset(self):
+        """Forget everything cached, e.g. after a new video is opened."""
+        with self._cond:
+            self._epoch += 1
+            self._queue.clear()
+            self.frames.clear()
+
+    def frame(self, frame_num: int) -> np.ndarray:
+        frame = self.frames.get(frame_num)
+        if frame is None:
+            frame = self.frames.put(frame_num, self._model.video_data[frame_num])
+        return frame
+
+    def navigate(self, frame_num: int, direction: int):
+        """Replace the prefetch queue with the frames after `frame_num` going `direction` (+1 / -1)."""
+        num_frames = len(self._model.video_data)
+        targets = [frame_num + direction * k for k in range(1, self.lookahead + 1)]
+        with self._cond:
+            self._queue.clear()
+            self._queue.extend(i for i in targets if 0 <= i < num_frames)
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        return {"frames": self.frames.stats(), "queued": len(self._queue)}
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                frame_num = self._queue.popleft()
+                epoch = self._epoch
+
+            frame = self.frames.get(frame_num, count=False)
+            if frame is None:
+                video_data = self._model.video_data
+                # queued for a previous, longer video that was swapped before the reset
+                if video_data is None or not 0 <= frame_num < len(video_data):
+                    continue
+                try:
+                    frame = video_data[frame_num]
+                except Exception as e:
+                    # skip the frame, the thread has to outlive a bad read
+                    print(f"Could not prefetch frame {frame_num}: {e}")
+                    continue
+
+            with self._cond:
+                # a reset while decoding means `frame` belongs to the previous video
+                if epoch != self._epoch:
+                    continue
+                self.frames.put(frame_num, frame)
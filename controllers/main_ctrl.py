@@ -7,8 +7,19 @@ import cv2
 import numpy as np
 from PyQt6 import QtCore, QtWidgets
 
+from controllers.frame_prefetcher import FramePrefetcher
+from controllers.optical_flow import DEFAULT_FLOW_ENGINE, FlowEngine, FlowStore, warp_label
+from controllers.osvos_pool import iter_segments
+from controllers.propagation import PropagationJob
 from controllers.render import Render
+from controllers.render_scheduler import RenderScheduler
 from controllers.tools import NoneTool, Tool
+from models.flow_cache import FlowCache
+from models.frame_cache import FrameCache
+from models.frame_source import FrameSource
+from models.label_volume import LabelVolume
+from osvos.schedule import Schedule
+from osvos.weights_cache import WeightsCache
 
 if TYPE_CHECKING:
     from models.model import Model
@@ -16,17 +27,44 @@ if TYPE_CHECKING:
 
 
 class MainController(QtCore.QObject):
-    def __init__(self, model: "Model"):
+    # why a propagation was not started
+    job_refused = QtCore.pyqtSignal(str)
+
+    def __init__(
+        self,
+        model: "Model",
+        frame_cache: FrameCache | None = None,
+        flow_cache: FlowCache | None = None,
+        osvos_cache: WeightsCache | None = None,
+        osvos_batch_size: int = 4,
+        osvos_export: str | None = None,
+        flow_precompute: FlowEngine | None = None,
+    ):
         super().__init__()
         self._model = model
         self._tool: Tool = NoneTool(model)
+        self._frame_cache = frame_cache
+        self._flow_cache = flow_cache
+        self._osvos_cache = osvos_cache
+        self.osvos_batch_size = osvos_batch_size
+        # name in osvos.export.EXPORTS of how to compile fine-tuned networks, None for the default
+        self.osvos_export = osvos_export
+        # weights-cache key of the last fine-tune of each key frame, to warm-start from
+        self._osvos_weights: dict[int, str] = {}
+        # engine whose flows are computed for the whole clip after a video is opened, None for none
+        self.flow_precompute = flow_precompute
+        self.prefetcher = FramePrefetcher(model)
+        self._thumbnails: np.ndarray | None = None
+        self._jobs: set[PropagationJob] = set()
 
     def set_view(self, view: "MainView"):
         self.view = view
-        self._render = Render(self._model, self.view)
+        self._render = Render(self._model, self.view, self.prefetcher)
+        self.render_scheduler = RenderScheduler(self._render)
 
     def render(self, inputs):
-        self._render(inputs)
+        # coalesced: a burst of model changes is drawn once, on the next display frame
+        self.render_scheduler.request(inputs)
 
     def open_video(self, fname):
         fname, _ = QtWidgets.QFileDialog.getOpenFileName(
@@ -34,32 +72,42 @@ class MainController(QtCore.QObject):
         )
 
         if fname:
-            cap = cv2.VideoCapture(fname)
-            if cap.isOpened() == False:
-                print("Error opening video stream or file")
-                return
-
-            frames = []
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                frames.append(frame)
-            frames = np.array(frames)
-            label = np.zeros((frames.shape[0], frames.shape[1], frames.shape[2]))
+            frames = self._frame_cache.open(fname) if self._frame_cache else None
+            if frames is None:
+                try:
+                    frames = FrameSource(fname)
+                except IOError as e:
+                    print(e)
+                    return
+                if self._frame_cache:
+                    # decode once in the background, the next open maps it directly
+                    self._frame_cache.store_async(fname)
+
+            # the frames first: setting the labels renders, and labels are shown over the frame
+            self._model.video_data = frames
+            self.prefetcher.reset()
+            label = LabelVolume(frames.shape[0], frames.shape[1], frames.shape[2])
             self._model.video_label = label
             self._model.video_polygon_label = dict()
-            self._model.video_data = frames
+            if self._model.flow is not None:
+                self._model.flow.stop()
+            self._model.flow = FlowStore(frames, fname, self._flow_cache)
+            if self.flow_precompute is not None:
+                self.precompute_flows(self.flow_precompute)
             self._model.video_url = fname
             self._model.frame_num = 0
             self._model.key_frames = set()
+            self._osvos_weights = {}
+            self._thumbnails = None
 
     def next_frame(self):
         max_frame_num = self._model.video_data.shape[0]
         self._model.frame_num = min(self._model.frame_num + 1, max_frame_num)
+        self.prefetcher.navigate(self._model.frame_num, 1)
 
     def previous_frame(self):
         self._model.frame_num = max(self._model.frame_num - 1, 0)
+        self.prefetcher.navigate(self._model.frame_num, -1)
 
     def zoomin(self):
         if self._model.zoom_ratio in {0, -1}:
@@ -74,6 +122,8 @@ class MainController(QtCore.QObject):
             self._model.zoom_ratio = max(self._model.zoom_ratio - 1, -10)
 
     def image_frame_mouse_press_event(self, event):
+        # tools map the click through top_left_image_coordinates, which rendering updates
+        self.render_scheduler.flush()
         self._tool.mouse_press(event)
 
     def image_frame_mouse_move_event(self, event):
@@ -137,33 +187,18 @@ class MainController(QtCore.QObject):
             if frame_num in key_frames:
                 continue
 
-            prev_label = video_label[frame_num - 1]
+            prev_label = video_label[frame_num - 1].copy()
             prev_label_polys = video_polygon_label.get(frame_num - 1, {}).items()
 
             label_polygons = list(sorted(prev_label_polys, key=lambda x: x[0]))
             for label, polygons in label_polygons:
                 for polygon in polygons:
                     cv2.fillPoly(prev_label, pts=[np.array(polygon, dtype=np.int32)], color=label)
+            video_label[frame_num - 1] = prev_label
 
             f = flow[frame_num - 1]
 
-            current_label = np.zeros_like(prev_label)
-            prev_xs = []
-            prev_ys = []
-            curr_xs = []
-            curr_ys = []
-            w, h = current_label.shape
-
-            for i in range(w):
-                for j in range(h):
-                    fj, fi = f[i, j]
-                    fj, fi = round(fj), round(fi)
-
-                    prev_xs.append(min(w - 1, max(0, i + fi)))
-                    prev_ys.append(min(h - 1, max(0, j + fj)))
-                    curr_xs.append(i)
-                    curr_ys.append(j)
-            current_label[curr_xs, curr_ys] = prev_label[prev_xs, prev_ys]
+            current_label = warp_label(prev_label, f)
 
             video_label[frame_num] = current_label
             video_polygon_label[frame_num] = {}
@@ -178,6 +213,19 @@ class MainController(QtCore.QObject):
 
     #### RUN
 
+    def thumbnails(self, size: tuple[int, int] = (128, 128)) -> np.ndarray:
+        """(num_frames, height, width, 3) uint8 thumbnails of the video, built once per video."""
+        width, height = size
+        if self._thumbnails is None or self._thumbnails.shape[1:3] != (height, width):
+            video_data = self._model.video_data
+            if isinstance(video_data, FrameSource):
+                self._thumbnails = video_data.thumbnails(size)
+            else:
+                self._thumbnails = np.stack(
+                    [cv2.resize(np.asarray(v, dtype=np.uint8), size, interpolation=cv2.INTER_AREA) for v in video_data]
+                )
+        return self._thumbnails
+
     def on_frame_clicked(self, i):
         selected_frames: set = self._model.run__selected_frames
         if i in selected_frames:
@@ -195,61 +243,67 @@ class MainController(QtCore.QObject):
                 cv2.fillPoly(prev_label, pts=[np.array(polygon, dtype=np.int32)], color=label)
         return prev_label
 
-    def run_optical_flow(self, pbar):
-        pbar.setValue(0)
-        selected_frames = self._model.run__selected_frames
-
-        video_data = self._model.video_data
+    def _start_job(self, frames: set, steps) -> PropagationJob | None:
+        busy = set().union(*(job.frames for job in self._jobs))
+        if busy & frames:
+            message = f"Frames {sorted(busy & frames)} are already being propagated"
+            print(message)
+            self.job_refused.emit(message)
+            return None
+
+        job = PropagationJob(frames, steps)
+        job.frame_done.connect(self.on_propagated_frame)
+        job.finished.connect(lambda: self._jobs.discard(job))
+        self._jobs.add(job)
+        # start on the next event loop turn, once the caller has connected its slots
+        QtCore.QTimer.singleShot(0, job.start)
+        return job
+
+    @QtCore.pyqtSlot(int, object)
+    def on_propagated_frame(self, frame_num: int, label: np.ndarray):
         video_label = self._model.video_label
         video_polygon_label = self._model.video_polygon_label
 
-        pbar_len = len(selected_frames)
-
-        for pbar_i, curr_i in enumerate(sorted(selected_frames)):
-            curr_img = video_data[curr_i]
-            prev_img = video_data[curr_i - 1]
-            prev_label = self.apply_poly(video_label[curr_i - 1], video_polygon_label.get(curr_i - 1, {}))
-
-            flow = cv2.calcOpticalFlowFarneback(
-                cv2.cvtColor(curr_img, cv2.COLOR_BGR2GRAY),
-                cv2.cvtColor(prev_img, cv2.COLOR_BGR2GRAY),
-                None,
-                0.5,
-                3,
-                15,
-                3,
-                5,
-                1.2,
-                0,
-            )
-
-            current_label = np.zeros_like(prev_label)
-            prev_xs, prev_ys, curr_xs, curr_ys = [], [], [], []
-            w, h = current_label.shape
-
-            for i in range(w):
-                for j in range(h):
-                    fj, fi = flow[i, j]
-                    fj, fi = round(fj), round(fi)
-
-                    prev_xs.append(min(w - 1, max(0, i + fi)))
-                    prev_ys.append(min(h - 1, max(0, j + fj)))
-                    curr_xs.append(i)
-                    curr_ys.append(j)
-            current_label[curr_xs, curr_ys] = prev_label[prev_xs, prev_ys]
-
-            video_label[curr_i] = current_label
-            video_polygon_label[curr_i] = {}
+        video_label[frame_num] = label
+        video_polygon_label[frame_num] = {}
 
-            pbar.setValue(int((pbar_i + 1) / pbar_len * 100))
-
-        self._model.video_label = video_label
         self._model.video_polygon_label = video_polygon_label
+        self._model.video_label = video_label
 
-    def run_osvos(self, pbar):
-        import osvos.main as osvos_model
+    def precompute_flows(self, engine: FlowEngine = DEFAULT_FLOW_ENGINE, frame_nums=None):
+        """Fill the flow cache for `engine` in the background, onto `frame_nums` (default the whole clip)."""
+        self._model.flow.with_engine(engine).precompute_async(frame_nums)
 
-        pbar.setValue(0)
+    def run_optical_flow(self, engine: FlowEngine = DEFAULT_FLOW_ENGINE) -> PropagationJob | None:
+        selected_frames = sorted(self._model.run__selected_frames)
+        video_label = self._model.video_label
+        video_polygon_label = self._model.video_polygon_label
+        flow_store = self._model.flow.with_engine(engine)
+
+        # labels a chain starts from are read now, inside a chain the job uses its own results
+        seeds = {
+            i - 1: self.apply_poly(video_label[i - 1], video_polygon_label.get(i - 1, {}))
+            for i in selected_frames
+            if i - 1 not in selected_frames
+        }
+
+        def steps(report):
+            # flows are computed in parallel ahead of time, labels are warped in frame order
+            flows = flow_store.iter_flows(selected_frames)
+            prev_i, prev_label = None, None
+            try:
+                for n, (curr_i, flow) in enumerate(flows):
+                    if prev_i != curr_i - 1:
+                        prev_label = seeds[curr_i - 1]
+                    prev_i, prev_label = curr_i, warp_label(prev_label, flow)
+                    yield curr_i, prev_label
+                    report((n + 1) / len(selected_frames))
+            finally:
+                flows.close()
+
+        return self._start_job(set(selected_frames), steps)
+
+    def run_osvos(self, schedule: Schedule | None = None, warm_start: bool = False) -> PropagationJob | None:
         key_frames = self._model.key_frames
         selected_frames = self._model.run__selected_frames
 
@@ -260,29 +314,51 @@ class MainController(QtCore.QObject):
         video_polygon_label = self._model.video_polygon_label
 
         sorted_key_frames = list(sorted(key_frames))
-        key_i = sorted_key_frames[-1]
+        key_i = len(sorted_key_frames) - 1
         selected_frames_by_key_frame = defaultdict(list)
         for curr_i in sorted(selected_frames, reverse=True):
-            if curr_i < sorted_key_frames[key_i]:
+            while key_i > 0 and curr_i < sorted_key_frames[key_i]:
                 key_i -= 1
             key_frame = sorted_key_frames[key_i]
             selected_frames_by_key_frame[key_frame].insert(0, curr_i)
 
-        pbar_len = len(selected_frames_by_key_frame)
-
-        for pbar_i, (key_frame, selected_frames) in enumerate(selected_frames_by_key_frame.items()):
-            img = video_data[key_frame]
-            label = self.apply_poly(video_label[curr_i - 1], video_polygon_label.get(curr_i - 1, {}))
-            label = (label == 1).reshape((*label.shape, 1)) * np.ones((*label.shape, 3)) * 255
-            test_image_list = [video_data[s] for s in selected_frames]
-
-            test_labels = osvos_model.run(img, label, test_image_list)
-
-            for t_label, t_frame in zip(test_labels, selected_frames, strict=True):
-                video_label[t_frame] = (t_label > 0.9) * 1
-                video_polygon_label[t_frame] = {}
-
-            pbar.setValue(int((pbar_i + 1) / pbar_len * 100))
+        key_labels = {
+            key_frame: self.apply_poly(video_label[key_frame], video_polygon_label.get(key_frame, {}))
+            for key_frame in selected_frames_by_key_frame
+        }
+
+        video_path = self._model.video_url or None
+        # key frames fine-tuned by earlier runs, the ones of this run train in parallel
+        finetuned = dict(self._osvos_weights)
+
+        def finished(key_frame, key):
+            # the weights the segment actually used, once all its frames are done
+            self._osvos_weights[key_frame] = key
+
+        def steps(report):
+            from osvos.export import DEFAULT_EXPORT, EXPORTS
+
+            segments = []
+            for key_frame, frames in selected_frames_by_key_frame.items():
+                init = None
+                others = [k for k in finetuned if k != key_frame]
+                if warm_start and others:
+                    init = finetuned[min(others, key=lambda k: abs(k - key_frame))]
+                label = key_labels[key_frame]
+                segments.append((key_frame, label, frames, init))
+
+            # segments only depend on their own key frame, they are fine-tuned in parallel
+            yield from iter_segments(
+                video_data,
+                video_path,
+                segments,
+                report,
+                frame_cache=self._frame_cache,
+                weights_cache=self._osvos_cache,
+                finished=finished,
+                batch_size=self.osvos_batch_size,
+                schedule=schedule,
+                export=EXPORTS[self.osvos_export or DEFAULT_EXPORT],
+            )
 
-        self._model.video_label = video_label
-        self._model.video_polygon_label = video_polygon_label
+        return self._start_job(set(selected_frames), steps)
@@ -0,0 +1,332 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from models.flow_cache import FlowCache, flow_params_key
+from models.frame_cache import video_key
+from models.frame_source import FrameSource
+
+
+@dataclass(frozen=True)
+class FlowEngine:
+    """A dense flow algorithm with fixed parameters, optionally run on a downscaled pyramid level.
+
+    `downscale` levels of `cv2.pyrDown` are applied to both frames before computing the
+    flow, which is then upsampled bilinearly and rescaled back to full-resolution pixels.
+    """
+
+    name: str
+    params: dict = field(default_factory=dict, hash=False)
+    downscale: int = 0
+
+    @property
+    def key(self) -> str:
+        return flow_params_key(self.name, {**self.params, "downscale": self.downscale})
+
+    def scaled(self, downscale: int) -> "FlowEngine":
+        return replace(self, downscale=downscale)
+
+    def _compute(self, curr_gray: np.ndarray, prev_gray: np.ndarray) -> np.ndarray:
+        if self.name == "farneback":
+            return cv2.calcOpticalFlowFarneback(curr_gray, prev_gray, None, **self.params)
+        if self.name == "dis":
+            return _dis_instance(self.params["preset"]).calc(curr_gray, prev_gray, None)
+        raise ValueError(f"unknown flow engine {self.name}")
+
+    def __call__(self, curr_gray: np.ndarray, prev_gray: np.ndarray) -> np.ndarray:
+        """Backward flow from the current frame to the previous one, as consumed by `warp_label`."""
+        if not self.downscale:
+            return self._compute(curr_gray, prev_gray)
+
+        h, w = curr_gray.shape
+        for _ in range(self.downscale):
+            curr_gray, prev_gray = cv2.pyrDown(curr_gray), cv2.pyrDown(prev_gray)
+        small_h, small_w = curr_gray.shape
+        flow = cv2.resize(self._compute(curr_gray, prev_gray), (w, h), interpolation=cv2.INTER_LINEAR)
+        flow[..., 0] *= w / small_w
+        flow[..., 1] *= h / small_h
+        return flow
+
+
+# DIS instances hold scratch buffers, keep one per preset and thread: a propagation job
+# and the background precompute may run DIS at the same time
+_dis_local = threading.local()
+
+
+def _dis_instance(preset: int):
+    instances = getattr(_dis_local, "instances", None)
+    if instances is None:
+        instances = _dis_local.instances = {}
+    dis = instances.get(preset)
+    if dis is None:
+        dis = instances[preset] = cv2.DISOpticalFlow_create(preset)
+    return dis
+
+
+# the parameters run_optical_flow has always used
+FARNEBACK_PARAMS = dict(pyr_scale=0.5, levels=3, winsize=15, iterations=3, poly_n=5, poly_sigma=1.2, flags=0)
+
+# engine name -> preset name -> engine, shown in RunView
+FLOW_ENGINES = {
+    "Farneback": {
+        "default": FlowEngine("farneback", FARNEBACK_PARAMS),
+    },
+    "DIS": {
+        "ultrafast": FlowEngine("dis", {"preset": cv2.DISOPTICAL_FLOW_PRESET_ULTRAFAST}),
+        "fast": FlowEngine("dis", {"preset": cv2.DISOPTICAL_FLOW_PRESET_FAST}),
+        "medium": FlowEngine("dis", {"preset": cv2.DISOPTICAL_FLOW_PRESET_MEDIUM}),
+    },
+}
+
+# resolution choices, as pyramid levels below full resolution
+FLOW_SCALES = {"full": 0, "1/2": 1, "1/4": 2}
+
+DEFAULT_FLOW_ENGINE = FLOW_ENGINES["Farneback"]["default"]
+
+
+def warp_label(prev_label: np.ndarray, flow: np.ndarray) -> np.ndarray:
+    """Pull `prev_label` along a dense backward flow with nearest-neighbour sampling.
+
+    `flow[y, x] = (dx, dy)` points from a pixel of the current frame to where it was in
+    the previous one. Displacements are rounded half-to-even and clamped to the frame,
+    matching the per-pixel loop this replaces.
+    """
+    h, w = prev_label.shape
+    rows = np.rint(flow[..., 1]).astype(np.intp)
+    rows += np.arange(h)[:, None]
+    np.clip(rows, 0, h - 1, out=rows)
+    cols = np.rint(flow[..., 0]).astype(np.intp)
+    cols += np.arange(w)[None, :]
+    np.clip(cols, 0, w - 1, out=cols)
+    return prev_label[rows, cols]
+
+
+# worker side: gray frames are read straight out of the parent's shared memory block
+_attached: dict[str, shared_memory.SharedMemory] = {}
+
+
+def _init_worker():
+    # one OpenCV thread per process, the pool provides the parallelism
+    cv2.setNumThreads(1)
+
+
+def _flow_task(engine: FlowEngine, shm_name: str, shape: tuple, curr_slot: int, prev_slot: int) -> np.ndarray:
+    shm = _attached.get(shm_name)
+    if shm is None:
+        # workers outlive runs: let go of the blocks of earlier ones, which are unlinked
+        for old in _attached.values():
+            old.close()
+        _attached.clear()
+        shm = _attached[shm_name] = shared_memory.SharedMemory(name=shm_name)
+    gray = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    return engine(gray[curr_slot], gray[prev_slot])
+
+
+# one pool per worker count, spawned on first use and kept across runs: starting
+# workers and importing cv2 in them costs more than the flows of a short range
+_pools: dict[int, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def _shared_pool(workers: int) -> ProcessPoolExecutor:
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None or pool._broken:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+            # spawn, not fork: the GUI process runs Qt and background threads
+            pool = _pools[workers] = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker
+            )
+        return pool
+
+
+@atexit.register
+def shutdown_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+        _pools.clear()
+
+
+def iter_flows(
+    video_data,
+    frame_nums: list[int],
+    engine: FlowEngine = DEFAULT_FLOW_ENGINE,
+    workers: int | None = None,
+    batch_size: int | None = None,
+):
+    """Yield `(i, flow from frame i to frame i - 1)` for each `i` in `frame_nums`, in order.
+
+    Flows only depend on the images, so they are computed on a process pool, kept
+    across calls, while the caller consumes earlier results. Ranges shorter than a batch
+    are computed in this process. Frames are converted to gray once in this process
+    and shared with the workers through a `SharedMemory` block instead of being pickled.
+    The block is double-buffered in batches, so memory stays bounded on long ranges.
+    """
+    frame_nums = list(frame_nums)
+    workers = workers or os.cpu_count() or 1
+    batch_size = batch_size or 2 * workers
+    if workers <= 1 or len(frame_nums) < batch_size:
+        for i in frame_nums:
+            yield i, engine(
+                cv2.cvtColor(video_data[i], cv2.COLOR_BGR2GRAY), cv2.cvtColor(video_data[i - 1], cv2.COLOR_BGR2GRAY)
+            )
+        return
+
+    _, h, w, _ = video_data.shape
+    region_slots = 2 * batch_size
+    shape = (2 * region_slots, h, w)
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+    gray = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    pool = _shared_pool(workers)
+    futures = []
+
+    def submit(batch, region):
+        slots = {}
+        for i in batch:
+            for f in (i - 1, i):
+                if f not in slots:
+                    slots[f] = region * region_slots + len(slots)
+                    cv2.cvtColor(video_data[f], cv2.COLOR_BGR2GRAY, dst=gray[slots[f]])
+        batch = [(i, pool.submit(_flow_task, engine, shm.name, shape, slots[i], slots[i - 1])) for i in batch]
+        futures.extend(future for _, future in batch)
+        return batch
+
+    try:
+        pending = deque()
+        for k, start in enumerate(range(0, len(frame_nums), batch_size)):
+            # region k % 2 is free: the batch that used it has been fully consumed
+            pending.append(submit(frame_nums[start : start + batch_size], k % 2))
+            if len(pending) == 2:
+                for i, future in pending.popleft():
+                    yield i, future.result()
+        while pending:
+            for i, future in pending.popleft():
+                yield i, future.result()
+    finally:
+        # the pool stays up: drop this run's queued tasks, wait for running ones to let go of the block
+        for future in futures:
+            future.cancel()
+        for future in futures:
+            try:
+                future.exception()
+            except Exception:
+                pass
+        del gray
+        shm.close()
+        shm.unlink()
+
+
+class FlowStore:
+    """Array-like of the backward flows of one video: `flow[k]` maps frame k + 1 onto frame k.
+
+    Fields are computed on demand and, when a `FlowCache` is given, persisted per video and
+    flow parameters so later runs and sessions reuse them. This is what `Model.flow` holds.
+    """
+
+    def __init__(
+        self,
+        video_data,
+        video_path: str | None,
+        cache: FlowCache | None = None,
+        engine: FlowEngine = DEFAULT_FLOW_ENGINE,
+    ):
+        self.video_data = video_data
+        self.video_path = video_path
+        self.cache = cache if video_path else None
+        self.video_key = video_key(video_path) if self.cache else None
+        self.engine = engine
+        self.params_key = engine.key
+        self._stop = threading.Event()
+
+    def with_engine(self, engine: FlowEngine) -> "FlowStore":
+        """A store over the same video and cache that computes flows with `engine`."""
+        if engine == self.engine:
+            return self
+        store = FlowStore(self.video_data, self.video_path, self.cache, engine)
+        # stopping this store stops the background work of the ones derived from it
+        store._stop = self._stop
+        return store
+
+    def __len__(self):
+        return max(len(self.video_data) - 1, 0)
+
+    def __getitem__(self, k: int) -> np.ndarray:
+        flow = self._cached(k)
+        if flow is None:
+            _, flow = next(iter_flows(self.video_data, [k + 1], self.engine, workers=1))
+            self._store(k, flow)
+        return flow
+
+    def _has(self, k: int) -> bool:
+        return bool(self.cache) and self.cache.contains(self.video_key, self.params_key, k)
+
+    def _cached(self, k: int) -> np.ndarray | None:
+        return self.cache.get(self.video_key, self.params_key, k) if self.cache else None
+
+    def _store(self, k: int, flow: np.ndarray):
+        if self.cache:
+            self.cache.put(self.video_key, self.params_key, k, flow)
+
+    def iter_flows(self, frame_nums, workers: int | None = None):
+        """Like `iter_flows`, but only frames without a cached flow are computed."""
+        frame_nums = list(frame_nums)
+        missing = deque(i for i in frame_nums if not self._has(i - 1))
+        computed = iter_flows(self.video_data, list(missing), self.engine, workers=workers)
+        try:
+            for i in frame_nums:
+                if missing and missing[0] == i:
+                    missing.popleft()
+                    _, flow = next(computed)
+                    self._store(i - 1, flow)
+                else:
+                    flow = self[i - 1]
+                yield i, flow
+        finally:
+            computed.close()
+
+    def precompute_async(self, frame_nums=None, workers: int | None = None):
+        """Fill the cache with the flows onto each of `frame_nums` (default: the whole clip)
+        on a daemon thread, until `stop` is called.
+
+        Frames are decoded by a `FrameSource` of its own, so the one the GUI reads from keeps
+        its decoder and chunk window. It also stops before the cache is full: past that,
+        every new field would evict one computed earlier.
+        """
+        if not self.cache:
+            return
+        frame_nums = [i for i in (frame_nums or range(1, len(self.video_data))) if not self._has(i - 1)]
+        if not frame_nums:
+            return
+        workers = workers or max((os.cpu_count() or 1) - 1, 1)
+        _, h, w, _ = self.video_data.shape
+        # float16 (dx, dy) plus the .npy header
+        field_bytes = h * w * 2 * np.dtype(np.float16).itemsize + 128
+
+        def _precompute():
+            own_source = isinstance(self.video_data, FrameSource)
+            video_data = FrameSource(self.video_path) if own_source else self.video_data
+            flows = iter_flows(video_data, frame_nums, self.engine, workers=workers)
+            try:
+                for i, flow in flows:
+                    if self._stop.is_set() or self.cache.room() < field_bytes:
+                        break
+                    self._store(i - 1, flow)
+            finally:
+                flows.close()
+                if own_source:
+                    video_data.close()
+
+        threading.Thread(target=_precompute, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
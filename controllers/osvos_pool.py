@@ -0,0 +1,210 @@
+import atexit
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from models.frame_cache import FrameCache
+from models.frame_source import FrameSource
+from osvos.weights_cache import WeightsCache
+
+# (key frame, key frame label map, frames propagated from it, weights key to warm-start from or None)
+Segment = tuple[int, np.ndarray, list[int], str | None]
+
+
+class _Cancelled(Exception):
+    pass
+
+
+# spawned on first use and kept across runs: its workers keep torch imported and their
+# process-wide ModelManager (parent and warm networks) resident between runs
+_pool: ProcessPoolExecutor | None = None
+_sync_manager = None
+_pool_lock = threading.Lock()
+
+
+def _shared_pool():
+    global _pool, _sync_manager
+    with _pool_lock:
+        # spawn, not fork: the GUI process runs Qt and background threads
+        context = multiprocessing.get_context("spawn")
+        if _sync_manager is None:
+            _sync_manager = context.Manager()
+        if _pool is None or _pool._broken:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            # worker processes are only started as tasks need them
+            _pool = ProcessPoolExecutor(os.cpu_count() or 1, mp_context=context)
+        return _pool, _sync_manager
+
+
+@atexit.register
+def shutdown_pool():
+    global _pool, _sync_manager
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+        if _sync_manager is not None:
+            _sync_manager.shutdown()
+            _sync_manager = None
+
+
+def _open_frames(video_path: str, frame_cache_dir: str | None):
+    frames = FrameCache(frame_cache_dir).open(video_path) if frame_cache_dir else None
+    return frames if frames is not None else FrameSource(video_path)
+
+
+def _run_segment(video_data, segment: Segment, progress, cache: WeightsCache | None, options: dict, finished=None):
+    import osvos.main as osvos_model
+
+    key_frame, label, frames, init = segment
+    masks = osvos_model.run(
+        video_data[key_frame],
+        label,
+        (video_data[s] for s in frames),
+        progress=progress,
+        cache=cache,
+        num_test=len(frames),
+        init=init,
+        finished=finished,
+        **options,
+    )
+    return zip(frames, masks, strict=True)
+
+
+def _segment_task(
+    video_path: str,
+    segment: Segment,
+    frame_cache_dir: str | None,
+    weights_cache_args: tuple | None,
+    options: dict,
+    events,
+    cancelled,
+    num_threads: int,
+):
+    import torch
+
+    # the pool provides the parallelism, each segment gets its share of the cores
+    torch.set_num_threads(num_threads)
+    key_frame = segment[0]
+    video_data = _open_frames(video_path, frame_cache_dir)
+    cache = WeightsCache(*weights_cache_args) if weights_cache_args else None
+
+    def progress(fraction):
+        if cancelled.is_set():
+            raise _Cancelled()
+        events.put(("progress", key_frame, fraction))
+
+    def finished(key):
+        events.put(("done", key_frame, key))
+
+    try:
+        for frame, mask in _run_segment(video_data, segment, progress, cache, options, finished):
+            events.put(("frame", key_frame, frame, mask))
+    except _Cancelled:
+        pass
+    finally:
+        if isinstance(video_data, FrameSource):
+            video_data.close()
+
+
+def iter_segments(
+    video_data,
+    video_path: str | None,
+    segments: list[Segment],
+    report,
+    frame_cache: FrameCache | None = None,
+    weights_cache: WeightsCache | None = None,
+    workers: int | None = None,
+    finished=None,
+    **options,
+):
+    """Run OSVOS on each key-frame segment and yield `(frame_num, label)` as frames finish.
+
+    Segments are independent, so with several of them each is fine-tuned and inferred in
+    a worker process, reading frames from the video (or the frame cache) itself. The
+    worker pool outlives the run, so later runs skip process start-up and find the
+    parent network already loaded. Cores are split evenly between the segments running
+    at once through torch's intra-op thread count.
+    `report` receives the mean progress over all segments. `finished`, if given, is
+    called with `(key_frame, weights_key)` once a segment has produced all its frames.
+    `options` go to `osvos.main.run`.
+    """
+    cores = os.cpu_count() or 1
+    workers = min(workers or cores, len(segments))
+    fractions = dict.fromkeys((segment[0] for segment in segments), 0.0)
+
+    def segment_progress(key_frame, fraction):
+        fractions[key_frame] = fraction
+        report(sum(fractions.values()) / len(fractions))
+
+    if workers <= 1 or video_path is None:
+        for segment in segments:
+            key_frame = segment[0]
+            progress = lambda f, key_frame=key_frame: segment_progress(key_frame, f)
+            done = (lambda key, key_frame=key_frame: finished(key_frame, key)) if finished else None
+            yield from _run_segment(video_data, segment, progress, weights_cache, options, done)
+            print(f"OSVOS segment from key frame {key_frame} done")
+        return
+
+    frame_cache_dir = frame_cache.cache_dir if frame_cache else None
+    weights_cache_args = (weights_cache.cache_dir, weights_cache.max_bytes) if weights_cache else None
+    pool, manager = _shared_pool()
+    events = manager.Queue()
+    cancelled = manager.Event()
+    futures = {}
+    try:
+        # at most `workers` segments at a time, queued ones start as others finish
+        pending = list(segments)
+
+        def submit():
+            segment = pending.pop(0)
+            future = pool.submit(
+                _segment_task,
+                video_path,
+                segment,
+                frame_cache_dir,
+                weights_cache_args,
+                options,
+                events,
+                cancelled,
+                max(1, cores // workers),
+            )
+            futures[future] = segment[0]
+
+        while pending and len(futures) < workers:
+            submit()
+        while True:
+            try:
+                event = events.get(timeout=0.1)
+            except queue.Empty:
+                for future in [f for f in futures if f.done()]:
+                    future.result()  # re-raises a worker's error
+                    print(f"OSVOS segment from key frame {futures.pop(future)} done")
+                    if pending:
+                        submit()
+                if not futures and events.empty():
+                    break
+                continue
+
+            if event[0] == "progress":
+                segment_progress(event[1], event[2])
+            elif event[0] == "done":
+                if finished is not None:
+                    finished(event[1], event[2])
+            else:
+                yield event[2], event[3]
+    finally:
+        # the pool stays up: stop this run's segments and wait for them to let go
+        cancelled.set()
+        for future in futures:
+            future.cancel()
+        for future in futures:
+            try:
+                future.exception()
+            except Exception:
+                pass
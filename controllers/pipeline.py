@@ -1,37 +1,68 @@
 class Job:
-    def __init__(self, name, stage, func, next_job_names=None):
+    def __init__(self, name, func, inputs=(), deps=()):
+        # `inputs` names the pipeline inputs `func` reads, `deps` the jobs whose outputs it reads
         self.name = name
-        self.stage = stage
         self.func = func
-        self.next_job_names = next_job_names
-    
+        self.inputs = tuple(inputs)
+        self.deps = tuple(deps)
+
     def __call__(self):
         self.func()
 
 class Pipeline:
-    def __init__(self, jobs: list[Job]):
+    """A DAG of jobs whose outputs are kept between runs.
+
+    The evaluation order is computed once. A run goes through it and calls a job only
+    when it is stale: one of its input values differs from its last run, one of its
+    dependencies ran since, or it was invalidated. Other jobs keep their previous output.
+    """
+
+    def __init__(self, jobs: list[Job], inputs: dict):
         _jobs_names = [j.name for j in jobs]
         assert len(_jobs_names) == len(set(_jobs_names))
         self.name_job_mapping = {job.name: job for job in jobs}
-    
-    def get_next_job(self, job_names: set):
-        next_job = list(
-            sorted(
-                [self.name_job_mapping[jn] for jn in job_names], key=lambda job: job.stage
-            )
-        )
-        if not next_job:
-            return None
-        next_job = next_job[0]
+        self._inputs = inputs
+        self._order = self._sorted(jobs)
+        self._signatures = {}
+        self._versions = dict.fromkeys(_jobs_names, 0)
+        self.last_ran = []
+
+    def _sorted(self, jobs):
+        order = []
+        done = set()
+        pending = list(jobs)
+        while pending:
+            ready = [job for job in pending if done.issuperset(job.deps)]
+            if not ready:
+                raise ValueError(f"Jobs with missing or cyclic dependencies: {[job.name for job in pending]}")
+            for job in ready:
+                pending.remove(job)
+                done.add(job.name)
+            order += ready
+        return order
 
-        job_names.remove(next_job.name)
-        if next_job.next_job_names:
-            for name in next_job.next_job_names:
-                job_names.add(name)
-        return next_job
+    def invalidate(self, job_names):
+        for name in job_names:
+            self._signatures.pop(name, None)
 
-    def run(self, job_names):
-        job_names = set(job_names)
-        
-        while job := self.get_next_job(job_names):
+    def run(self, job_names=()):
+        """Invalidate `job_names`, then run every stale job. Returns the names of the jobs that ran."""
+        self.invalidate(job_names)
+        values = {}
+        ran = []
+        for job in self._order:
+            for key in job.inputs:
+                if key not in values:
+                    values[key] = self._inputs[key]()
+            signature = (
+                tuple(values[key] for key in job.inputs),
+                tuple(self._versions[name] for name in job.deps),
+            )
+            if self._signatures.get(job.name) == signature:
+                continue
             job.func()
+            self._versions[job.name] += 1
+            self._signatures[job.name] = signature
+            ran.append(job.name)
+        self.last_ran = ran
+        return ran
@@ -0,0 +1,55 @@
+import time
+import traceback
+from typing import Callable, Iterator
+
+import numpy as np
+from PyQt6 import QtCore
+
+# a propagation body: takes a `report(fraction)` callback, yields finished (frame_num, label)
+Steps = Callable[[Callable[[float], None]], Iterator[tuple[int, np.ndarray]]]
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class PropagationJob(QtCore.QThread):
+    """Runs a label propagation off the GUI thread and streams each finished frame back.
+
+    Results are delivered through `frame_done` on the GUI thread, where they are written
+    into the model. `cancel` takes effect at the next finished frame or progress report.
+    """
+
+    frame_done = QtCore.pyqtSignal(int, object)
+    progress = QtCore.pyqtSignal(int, float)  # percent, ETA in seconds
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, frames: set, steps: Steps):
+        super().__init__()
+        self.frames = set(frames)
+        self.cancelled = False
+        self._steps = steps
+        self._start_time = 0.0
+
+    def cancel(self):
+        self.requestInterruption()
+
+    def report(self, fraction: float):
+        if self.isInterruptionRequested():
+            raise JobCancelled()
+        elapsed = time.monotonic() - self._start_time
+        eta = elapsed * (1 - fraction) / fraction if fraction > 0 else float("nan")
+        self.progress.emit(int(fraction * 100), eta)
+
+    def run(self):
+        self._start_time = time.monotonic()
+        try:
+            for frame_num, label in self._steps(self.report):
+                self.frame_done.emit(frame_num, label)
+                if self.isInterruptionRequested():
+                    raise JobCancelled()
+        except JobCancelled:
+            self.cancelled = True
+        except Exception as e:
+            traceback.print_exc()
+            self.failed.emit(str(e))
@@ -4,66 +4,153 @@ from typing import TYPE_CHECKING
 import cv2
 
 if TYPE_CHECKING:
+    from controllers.frame_prefetcher import FramePrefetcher
     from models.model import Model
     from views.main_view import MainView
 
+# label value drawn at the corners of the polygon being edited
+POLYGON_CORNER = 255
+
+
+def label_palette() -> np.ndarray:
+    """Opaque RGBA colour of every uint8 label value, as a (256, 4) uint8 lookup table.
+
+    Labels 1-3 keep their red, green and blue; further labels get hues spread by the
+    golden ratio so neighbouring label values stay distinguishable.
+    """
+    hues = (np.arange(256) * 0.618033988749895 % 1 * 180).astype(np.uint8)
+    hsv = np.stack([hues, np.full(256, 255, np.uint8), np.full(256, 255, np.uint8)], axis=-1)
+    palette = cv2.cvtColor(cv2.cvtColor(hsv[None], cv2.COLOR_HSV2RGB), cv2.COLOR_RGB2RGBA)[0]
+    palette[0] = [0, 0, 0, 255]
+    palette[1] = [255, 0, 0, 255]
+    palette[2] = [0, 255, 0, 255]
+    palette[3] = [0, 0, 255, 255]
+    palette[POLYGON_CORNER] = [255, 255, 255, 255]
+    return palette
+
+LABEL_PALETTE = label_palette()
+
 class RenderInput:
     ROOT = "root"
     IMAGE_INITIAL = "_image_initial"
     LABEL_INITIAL = "_label_initial"
     IMAGE_FRAME_INITIAL = "_image_frame_initial"
+    VIEWPORT = "_viewport"
     IMAGE_ZOOM = "_image_zoom"
     LABEL_ZOOM = "_label_zoom"
-    IMAGE_MOVE_AND_APPLY = "_image_move_and_apply"
-    LABEL_MOVE_AND_APPLY = "_label_move_and_apply"
-    SHOW = "show"
+    LABEL_COLOR = "_label_color"
+    SHOW_IMAGE = "show_image"
+    SHOW_LABEL = "show_label"
 
 class Render:
-    def __init__(self, model: "Model", view: "MainView"):
+    def __init__(self, model: "Model", view: "MainView", prefetcher: "FramePrefetcher"):
+        # each job reruns only when its inputs changed or a job it depends on ran;
+        # invalidating ROOT reruns everything
         self._pipeline = Pipeline(
             [
-                Job(name=RenderInput.ROOT, stage=0, func=lambda:None, next_job_names=[RenderInput.IMAGE_INITIAL, RenderInput.LABEL_INITIAL, RenderInput.IMAGE_FRAME_INITIAL]),
-                Job(name=RenderInput.IMAGE_INITIAL, stage=0, func=self._image_initial, next_job_names=[RenderInput.IMAGE_ZOOM]),
-                Job(name=RenderInput.LABEL_INITIAL, stage=0, func=self._label_initial, next_job_names=[RenderInput.LABEL_ZOOM]),
-                Job(name=RenderInput.IMAGE_FRAME_INITIAL, stage=0, func=self._image_frame_initial, next_job_names=[RenderInput.IMAGE_MOVE_AND_APPLY]),
-                Job(name=RenderInput.IMAGE_ZOOM, stage=1, func=self._image_zoom, next_job_names=[RenderInput.IMAGE_MOVE_AND_APPLY]),
-                Job(name=RenderInput.LABEL_ZOOM, stage=1, func=self._label_zoom, next_job_names=[RenderInput.LABEL_MOVE_AND_APPLY]),
-                Job(name=RenderInput.IMAGE_MOVE_AND_APPLY, stage=2, func=self._image_move_and_apply, next_job_names=[RenderInput.LABEL_MOVE_AND_APPLY]),
-                Job(name=RenderInput.LABEL_MOVE_AND_APPLY, stage=3, func=self._label_move_and_apply, next_job_names=[RenderInput.SHOW]),
-                Job(name=RenderInput.SHOW, stage=4, func=self._show, next_job_names=[]),
-            ]
+                Job(name=RenderInput.ROOT, func=lambda:None),
+                Job(name=RenderInput.IMAGE_INITIAL, func=self._image_initial, inputs=["video", "frame_num"], deps=[RenderInput.ROOT]),
+                Job(name=RenderInput.LABEL_INITIAL, func=self._label_initial, inputs=["frame_num", "label_version"], deps=[RenderInput.ROOT]),
+                Job(name=RenderInput.IMAGE_FRAME_INITIAL, func=self._image_frame_initial, inputs=["frame_size"], deps=[RenderInput.ROOT]),
+                Job(name=RenderInput.VIEWPORT, func=self._viewport, inputs=["zoom_ratio", "coordinates"], deps=[RenderInput.IMAGE_INITIAL, RenderInput.IMAGE_FRAME_INITIAL]),
+                Job(name=RenderInput.IMAGE_ZOOM, func=self._image_zoom, deps=[RenderInput.VIEWPORT]),
+                Job(name=RenderInput.LABEL_ZOOM, func=self._label_zoom, inputs=["polygon_version"], deps=[RenderInput.LABEL_INITIAL, RenderInput.VIEWPORT]),
+                Job(name=RenderInput.LABEL_COLOR, func=self._label_color, deps=[RenderInput.LABEL_ZOOM]),
+                Job(name=RenderInput.SHOW_IMAGE, func=self._show_image, deps=[RenderInput.IMAGE_ZOOM]),
+                Job(name=RenderInput.SHOW_LABEL, func=self._show_label, deps=[RenderInput.LABEL_COLOR]),
+            ],
+            inputs={
+                "video": lambda: id(self._model.video_data),
+                "frame_num": lambda: self._model.frame_num,
+                "label_version": lambda: self._model.label_version,
+                "polygon_version": lambda: self._model.polygon_version,
+                "frame_size": self._image_frame_size,
+                "zoom_ratio": lambda: self._model.zoom_ratio,
+                "coordinates": lambda: self._model.coordinates,
+            },
         )
         self._model = model
         self.view = view
+        self._prefetcher = prefetcher
 
     def _image_initial(self):
         frame_num = self._model.frame_num
-        self._model.render_data.initial_image = self._model.video_data[frame_num]
+        self._model.render_data.initial_image = self._prefetcher.frame(frame_num)
     
     def _label_initial(self):
         frame_num = self._model.frame_num
         self._model.render_data.initial_label = self._model.video_label[frame_num]
     
-    def _zoom(self, img, ratio: int):
-        if ratio > 1:
-            # zoomin
-            img = np.repeat(img, ratio, axis=0)
-            img = np.repeat(img, ratio, axis=1)
-        elif ratio < -1:
-            # zoomout
-            step = int(-ratio)
-            start = step // 2
-            img = img[start::step, start::step]
-        return np.float32(img)
-    
+    def _zoom_scale(self) -> float:
+        zoom_ratio = self._model.zoom_ratio
+        return zoom_ratio if zoom_ratio > 0 else -1 / zoom_ratio
+
+    def _viewport_axis(self, image_len, frame_len, move):
+        """Along one axis: where the zoomed image starts in the image frame, the first
+        image frame pixel it covers, and the source pixel shown at each covered pixel."""
+        zoom_ratio = self._model.zoom_ratio
+        if zoom_ratio > 1:
+            zoomed_len = image_len * zoom_ratio
+        elif zoom_ratio < -1:
+            zoomed_len = len(range(-zoom_ratio // 2, image_len, -zoom_ratio))
+        else:
+            zoomed_len = image_len
+        move = move * self._zoom_scale()
+
+        inter_0 = max(- zoomed_len / 2 + move, - frame_len / 2)
+        inter_1 = min(zoomed_len / 2 + move, frame_len / 2)
+        image_0 = min(int(inter_0 + zoomed_len / 2 - move + 0.01), zoomed_len)
+        image_1 = max(int(inter_1 + zoomed_len / 2 - move + 0.01), 0)
+        frame_0 = int(inter_0 + frame_len / 2 + 0.01)
+        length = max(min(image_1 - image_0, frame_len - frame_0), 0)
+
+        # nearest neighbour: zooming in repeats source pixels, zooming out skips them
+        zoomed = np.arange(image_0, image_0 + length)
+        if zoom_ratio > 1:
+            source = zoomed // zoom_ratio
+        elif zoom_ratio < -1:
+            source = -zoom_ratio // 2 + zoomed * -zoom_ratio
+        else:
+            source = zoomed
+        return frame_0 - image_0, frame_0, source
+
+    def _viewport(self):
+        image_h, image_w = self._model.render_data.initial_image.shape[:2]
+        frame_h, frame_w = self._model.render_data.initial_image_frame.shape[:2]
+        move_y, move_x = self._model.coordinates
+        y_t, frame_y0, rows = self._viewport_axis(image_h, frame_h, move_y)
+        x_t, frame_x0, cols = self._viewport_axis(image_w, frame_w, move_x)
+
+        self._model.top_left_image_coordinates = (y_t, x_t)
+        self._window = (
+            slice(frame_y0, frame_y0 + len(rows)),
+            slice(frame_x0, frame_x0 + len(cols)),
+        )
+        self._rows, self._cols = rows, cols
+
+    def _scale_into(self, img, out):
+        """Nearest-neighbour scale the visible part of the source `img` into the image frame sized `out`.
+
+        Only the source rectangle under the window is read, so the cost follows the window
+        size whatever the zoom.
+        """
+        rows, cols = self._rows, self._cols
+        if not len(rows) or not len(cols):
+            return
+        step = max(-self._model.zoom_ratio, 1)
+        crop = img[rows[0]:rows[-1] + 1:step, cols[0]:cols[-1] + 1:step]
+        np.take(np.take(crop, (rows - rows[0]) // step, axis=0), (cols - cols[0]) // step, axis=1, out=out[self._window])
+
     def _apply_polygons(self, initial_label):
-        initial_label = initial_label.copy()
         frame_num = self._model.frame_num
         label_polygons = (
             list(self._model.video_polygon_label.get(frame_num, {}).items())
             + list(self._model.video_polygon_label.get(-1, {}).items())
         )
+        if not label_polygons:
+            return initial_label
 
+        initial_label = initial_label.copy()
         label_polygons = list(sorted(label_polygons, key=lambda x: x[0]))
         for label, polygons in label_polygons:
             for polygon in polygons:
@@ -71,107 +158,60 @@ class Render:
         return initial_label
     
     def _apply_polygon_corners(self, zoomed_label):
-        zoom_ratio = self._model.zoom_ratio
-        ratio = 1
-        if zoom_ratio > 1:
-            ratio = zoom_ratio
-        elif zoom_ratio < -1:
-            ratio = -1 / zoom_ratio
+        ratio = self._zoom_scale()
+        y_t, x_t = self._model.top_left_image_coordinates
 
         label_polygons = list(self._model.video_polygon_label.get(-1, {}).items())
         for label, polygons in label_polygons:
             for polygon in polygons:
                 for point in polygon:
-                    x, y = round(point[0] * ratio), round(point[1] * ratio)
-                    cv2.circle(zoomed_label, (x, y), 4, -1, 1)
+                    x, y = round(point[0] * ratio) + x_t, round(point[1] * ratio) + y_t
+                    cv2.circle(zoomed_label, (x, y), 4, POLYGON_CORNER, 1)
         return zoomed_label
 
     def _image_zoom(self):
-        zoom_ratio = self._model.zoom_ratio
-        self._model.render_data.zoomed_image = self._zoom(self._model.render_data.initial_image, zoom_ratio)
+        zoomed_image = self._model.render_data.zoomed_image
+        zoomed_image[...] = self._model.render_data.initial_image_frame
+        # frames are decoded BGR, the image layer is RGB
+        self._scale_into(self._model.render_data.initial_image[..., ::-1], zoomed_image)
 
     def _label_zoom(self):
-        zoom_ratio = self._model.zoom_ratio
-        initial_label = self._model.render_data.initial_label
-        initial_label = self._apply_polygons(initial_label)
-        zoomed_label = self._zoom(initial_label, zoom_ratio)
-        zoomed_label = self._apply_polygon_corners(zoomed_label)
-        self._model.render_data.zoomed_label = zoomed_label
-
-    def _image_frame_initial(self):
-        image_frame_height=self.view._ui.image_frame.rect().bottom()
-        image_frame_width=self.view._ui.image_frame.rect().right()
-        self._model.render_data.initial_image_frame = np.zeros((image_frame_height, image_frame_width, 3), dtype="uint8") + 128
-
-    def _move_and_apply(self, frm, to, alpha):
-        image = frm
-        image_frame = to.copy()
-        image_h, image_w, _ = image.shape
-        frame_h, frame_w, _ = image_frame.shape
-        move_y, move_x = self._model.coordinates
-
-        zoom_ratio = self._model.zoom_ratio if self._model.zoom_ratio > 0 else -1 / self._model.zoom_ratio
-        move_x = move_x * zoom_ratio
-        move_y = move_y * zoom_ratio
-
-        image_left_edge = - image_w / 2 + move_x
-        image_right_edge = image_w / 2 + move_x
-        image_top_edge = - image_h / 2 + move_y
-        image_bottom_edge = image_h / 2 + move_y
-
-        frame_left_edge = - frame_w / 2
-        frame_right_edge = frame_w / 2
-        frame_top_edge = - frame_h / 2
-        frame_bottom_edge = frame_h / 2
-
-        inter_x0 = max(image_left_edge, frame_left_edge)
-        inter_y0 = max(image_top_edge, frame_top_edge)
-        inter_x1 = min(image_right_edge, frame_right_edge)
-        inter_y1 = min(image_bottom_edge, frame_bottom_edge)
-
-        image_x0 = min(int(inter_x0 + image_w / 2 - move_x + 0.01), image_w)
-        image_y0 = min(int(inter_y0 + image_h / 2 - move_y + 0.01), image_h)
-        image_x1 = max(int(inter_x1 + image_w / 2 - move_x + 0.01), 0)
-        image_y1 = max(int(inter_y1 + image_h / 2 - move_y + 0.01), 0)
-        
-        frame_x0 = int(inter_x0 + frame_w / 2 + 0.01)
-        frame_y0 = int(inter_y0 + frame_h / 2 + 0.01)
-        frame_x1 = frame_x0 + image_x1 - image_x0
-        frame_y1 = frame_y0 + image_y1 - image_y0
-
-        image_frame[int(frame_y0):int(frame_y1), int(frame_x0): int(frame_x1)] = (
-            image_frame[int(frame_y0):int(frame_y1), int(frame_x0): int(frame_x1)] * (1 - alpha) + 
-            image[int(image_y0):int(image_y1), int(image_x0):int(image_x1)] * alpha
-        ).astype("uint8")
-
-        x_t = frame_x0 - image_x0
-        y_t = frame_y0 - image_y0
-        return image_frame, (y_t, x_t)
-
-    def _image_move_and_apply(self):
-        initial_image_frame2, top_left_image_coordinates = self._move_and_apply(
-            self._model.render_data.zoomed_image,
-            self._model.render_data.initial_image_frame,
-            1,
-        )
-        self._model.top_left_image_coordinates = top_left_image_coordinates
-        self._model.render_data.initial_image_frame2 = initial_image_frame2
-    
-    def _label_move_and_apply(self):
         zoomed_label = self._model.render_data.zoomed_label
-        zoomed_label_image = np.zeros((*zoomed_label.shape, 3))
+        zoomed_label[...] = 0
+        initial_label = self._apply_polygons(self._model.render_data.initial_label)
+        self._scale_into(initial_label, zoomed_label)
+        self._apply_polygon_corners(zoomed_label)
 
-        zoomed_label_image[zoomed_label==-1] = [255, 255, 255]
-        zoomed_label_image[zoomed_label==1] = [0, 0, 255]
-        zoomed_label_image[zoomed_label==2] = [0, 255, 0]
-        zoomed_label_image[zoomed_label==3] = [255, 0, 0]
+    def _image_frame_size(self):
+        rect = self.view._ui.image_frame.rect()
+        return rect.bottom(), rect.right()
 
-        self._model.render_data.image_frame, _ = self._move_and_apply(
-            zoomed_label_image, self._model.render_data.initial_image_frame2, self._model.alpha / 100
-        )
-
-    def _show(self):
-        self._model.image_frame = self._model.render_data.image_frame
-
-    def __call__(self, inputs:list[RenderInput]):
-        self._pipeline.run(job_names=inputs)
+    def _image_frame_initial(self):
+        image_frame_height, image_frame_width = self._image_frame_size()
+        render_data = self._model.render_data
+        render_data.initial_image_frame = np.zeros((image_frame_height, image_frame_width, 3), dtype="uint8") + 128
+        # reused by every render until the image frame is resized
+        render_data.zoomed_image = np.empty_like(render_data.initial_image_frame)
+        render_data.zoomed_label = np.zeros((image_frame_height, image_frame_width), dtype=np.uint8)
+        render_data.colored_label = np.zeros((image_frame_height, image_frame_width, 4), dtype=np.uint8)
+
+    def _label_color(self):
+        # transparent outside the zoomed image; the view blends it over the image layer with the alpha
+        render_data = self._model.render_data
+        window = self._window
+        render_data.colored_label[...] = 0
+        np.take(LABEL_PALETTE, render_data.zoomed_label[window], axis=0, out=render_data.colored_label[window], mode="clip")
+
+    def _show_image(self):
+        self._model.image_layer = self._model.render_data.zoomed_image
+
+    def _show_label(self):
+        self._model.label_layer = self._model.render_data.colored_label
+
+    @property
+    def last_ran(self) -> list[str]:
+        return self._pipeline.last_ran
+
+    def __call__(self, inputs:list[RenderInput]) -> list[str]:
+        # `inputs` are rerun even if their declared inputs look unchanged
+        return self._pipeline.run(job_names=inputs)
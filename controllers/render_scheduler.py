@@ -0,0 +1,70 @@
+import math
+import time
+from typing import Callable
+
+from PyQt6 import QtCore, QtGui
+
+
+def display_interval() -> float:
+    """Seconds between two refreshes of the primary screen, 60 Hz when it is unknown."""
+    screen = QtGui.QGuiApplication.primaryScreen()
+    rate = screen.refreshRate() if screen is not None else 0
+    return 1 / (rate if rate > 0 else 60)
+
+
+class RenderScheduler(QtCore.QObject):
+    """Defers render requests and runs them at most once per display frame.
+
+    Requests made before a flush are merged into one render of all the jobs they
+    invalidate; the render runs from the event loop, so everything queued before it
+    (e.g. the rest of a burst of mouse moves) has already been merged. A request
+    right after an idle period still renders on the next event loop pass.
+
+    `merged` counts requests that joined an already pending render instead of
+    causing their own, and `dropped` those of them that invalidated nothing new.
+    """
+
+    def __init__(self, render: Callable[[list[str]], list[str]], interval: float | None = None):
+        super().__init__()
+        self._render = render
+        self.interval = display_interval() if interval is None else interval
+        self._pending: set[str] | None = None
+        self._last_flush = 0.0
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+
+        self.requests = 0
+        self.renders = 0
+        self.merged = 0
+        self.dropped = 0
+
+    @property
+    def pending(self) -> bool:
+        return self._pending is not None
+
+    def request(self, inputs: list[str]):
+        self.requests += 1
+        if self._pending is None:
+            self._pending = set(inputs)
+            wait = self._last_flush + self.interval - time.monotonic()
+            self._timer.start(max(0, math.ceil(wait * 1000)))
+            return
+
+        self.merged += 1
+        if self._pending.issuperset(inputs):
+            self.dropped += 1
+        self._pending.update(inputs)
+
+    def flush(self) -> list[str]:
+        """Run the pending render now, if any. Returns the jobs that ran."""
+        self._timer.stop()
+        if self._pending is None:
+            return []
+        inputs, self._pending = self._pending, None
+        self._last_flush = time.monotonic()
+        self.renders += 1
+        return self._render(list(inputs))
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "renders": self.renders, "merged": self.merged, "dropped": self.dropped}
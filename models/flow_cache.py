@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+
+def flow_params_key(engine: str, params: dict) -> str:
+    """Stable key for a flow engine and its parameters, part of every cache entry's path."""
+    ident = json.dumps({"engine": engine, "params": params}, sort_keys=True)
+    return hashlib.sha1(ident.encode()).hexdigest()[:16]
+
+
+class FlowCache:
+    """On-disk cache of dense flow fields stored as float16 `.npy` files, loaded memory-mapped.
+
+    An entry is addressed by video key, flow parameters key and frame pair, laid out as
+    `<video_key>/<params_key>/<k>-<k+1>.npy`. The total size is capped at `max_bytes`;
+    when exceeded, the least recently used fields are evicted down to 90% of the cap.
+    """
+
+    DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "vidsegtool", "flows")
+
+    def __init__(self, cache_dir: str = DEFAULT_DIR, max_bytes: int = 10 * 1024**3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._nbytes = sum(size for _, size, _ in self._entries())
+
+    def _path(self, video_key: str, params_key: str, k: int) -> str:
+        return os.path.join(self.cache_dir, video_key, params_key, f"{k}-{k + 1}.npy")
+
+    def room(self) -> int:
+        """Bytes that can still be added before the cache starts evicting."""
+        with self._lock:
+            return max(self.max_bytes - self._nbytes, 0)
+
+    def contains(self, video_key: str, params_key: str, k: int) -> bool:
+        return os.path.exists(self._path(video_key, params_key, k))
+
+    def get(self, video_key: str, params_key: str, k: int) -> np.ndarray | None:
+        path = self._path(video_key, params_key, k)
+        try:
+            flow = np.load(path, mmap_mode="r")
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return flow
+
+    def put(self, video_key: str, params_key: str, k: int, flow: np.ndarray):
+        path = self._path(video_key, params_key, k)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # np.save appends .npy to names that lack it
+        tmp_path = f"{path[:-len('.npy')]}.{os.getpid()}.{threading.get_ident()}.tmp.npy"
+        np.save(tmp_path, flow.astype(np.float16))
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._nbytes += size
+            if self._nbytes > self.max_bytes:
+                self._evict(int(self.max_bytes * 0.9))
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        entries = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith(".npy") and ".tmp" not in name:
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def _evict(self, budget: int):
+        entries = self._entries()
+        self._nbytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._nbytes <= budget:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._nbytes -= size
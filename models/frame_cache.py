@@ -0,0 +1,139 @@
+import errno
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from models.frame_source import FrameSource
+
+
+def video_key(path: str) -> str:
+    """Identity of a video file's content as seen by the caches: path, size and mtime."""
+    stat = os.stat(path)
+    ident = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(ident.encode()).hexdigest()
+
+
+class FrameCache:
+    """On-disk cache of fully decoded videos stored as raw uint8 `np.memmap` files.
+
+    Entries are keyed by absolute path, size and mtime of the source video, so an
+    edited file never hits a stale entry. Mapping an entry is zero-copy: the OS page
+    cache backs it and several processes opening the same clip share its pages.
+    The total size is capped at `max_bytes`, evicting least recently opened videos.
+    """
+
+    DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "vidsegtool", "frames")
+    # a temporary file untouched for this long was left by a writer that died
+    STALE_TMP_SECONDS = 3600
+
+    def __init__(self, cache_dir: str = DEFAULT_DIR, max_bytes: int = 20 * 1024**3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pending = set()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, key: str) -> tuple[str, str]:
+        base = os.path.join(self.cache_dir, key)
+        return base + ".raw", base + ".json"
+
+    def open(self, path: str) -> np.memmap | None:
+        raw_path, meta_path = self._paths(video_key(path))
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            frames = np.memmap(raw_path, dtype=np.dtype(meta["dtype"]), mode="r", shape=tuple(meta["shape"]))
+            # mtime doubles as the LRU timestamp
+            os.utime(raw_path)
+        except (OSError, ValueError, KeyError):
+            # also when another process evicted the entry meanwhile
+            return None
+        return frames
+
+    def store(self, path: str) -> np.memmap | None:
+        raw_path, meta_path = self._paths(video_key(path))
+        source = FrameSource(path)
+        try:
+            nbytes = int(np.prod(source.shape))
+            if nbytes > self.max_bytes:
+                return None
+            self._evict(self.max_bytes - nbytes)
+            if shutil.disk_usage(self.cache_dir).free < nbytes:
+                raise OSError(errno.ENOSPC, f"{nbytes} bytes needed in {self.cache_dir}")
+
+            # decode into a temporary file, readers only ever see complete entries; plain
+            # writes, so a full disk raises OSError where writing a mapping would SIGBUS
+            tmp_path = f"{raw_path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    for frame in source:
+                        f.write(frame.tobytes())
+                os.replace(tmp_path, raw_path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+
+            with open(meta_path, "w") as f:
+                json.dump({"path": os.path.abspath(path), "shape": source.shape, "dtype": source.dtype.str}, f)
+        finally:
+            source.close()
+        return self.open(path)
+
+    def store_async(self, path: str):
+        """Populate the cache for `path` on a daemon thread, at most once per video."""
+        with self._lock:
+            if path in self._pending:
+                return
+            self._pending.add(path)
+
+        def _store():
+            try:
+                self.store(path)
+            except OSError as e:
+                print(f"Could not cache decoded frames for {path}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(path)
+
+        threading.Thread(target=_store, daemon=True).start()
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        # entries and temporary files being written, which count against the cap too
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith((".raw", ".tmp")):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def _evict(self, budget: int):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            if total <= budget:
+                break
+            try:
+                if path.endswith(".tmp"):
+                    # another writer's file, unless it was abandoned
+                    if time.time() - mtime < self.STALE_TMP_SECONDS:
+                        continue
+                    os.remove(path)
+                else:
+                    os.remove(path)
+                    os.remove(path[: -len(".raw")] + ".json")
+            except OSError:
+                # still mapped by another process on platforms that lock mapped files
+                continue
+            total -= size
@@ -0,0 +1,145 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from models.seek_index import SeekIndex
+
+
+class FrameSource:
+    """Read-only, array-like view over a video file that decodes frames on demand.
+
+    Frames are decoded in chunks of `chunk_size` consecutive frames and kept in a
+    bounded LRU window, so memory stays within `memory_budget` bytes no matter how
+    long the video is. Supports `len()`, `.shape`, `.dtype` and `[i]` / `[a:b]`
+    indexing like the `np.ndarray` it replaces in `Model.video_data`.
+
+    Random access goes through a `SeekIndex`, so a jump only decodes from the
+    nearest preceding keyframe instead of from wherever the decoder happens to be.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 16, memory_budget: int = 512 * 1024**2):
+        self.path = path
+        self._cap = cv2.VideoCapture(path)
+        if not self._cap.isOpened():
+            raise IOError(f"Error opening video stream or file: {path}")
+
+        self._lock = threading.RLock()
+        self._next_pos = 0
+
+        self.index = SeekIndex.open(path)
+        num_frames = len(self.index) or int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        width = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self._cap.get(cv2.CAP_PROP_FPS)
+        self.shape = (num_frames, height, width, 3)
+        self.dtype = np.dtype(np.uint8)
+        self.ndim = 4
+
+        self.chunk_size = chunk_size
+        chunk_bytes = chunk_size * height * width * 3
+        self.max_chunks = max(1, memory_budget // max(chunk_bytes, 1))
+        self._chunks: OrderedDict[int, np.ndarray] = OrderedDict()
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return np.stack([self._get_frame(i) for i in range(*key.indices(len(self)))])
+        if isinstance(key, tuple):
+            return self[key[0]][key[1:]]
+        return self._get_frame(key)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._get_frame(i)
+
+    def __array__(self, dtype=None, copy=None):
+        frames = self[:]
+        return frames if dtype is None else frames.astype(dtype)
+
+    @property
+    def nbytes_cached(self):
+        return sum(chunk.nbytes for chunk in self._chunks.values())
+
+    def _get_frame(self, i: int) -> np.ndarray:
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"frame index {i} out of range for video with {len(self)} frames")
+
+        chunk_idx, offset = divmod(i, self.chunk_size)
+        with self._lock:
+            chunk = self._chunks.get(chunk_idx)
+            if chunk is None:
+                chunk = self._decode_chunk(chunk_idx)
+                self._chunks[chunk_idx] = chunk
+                while len(self._chunks) > self.max_chunks:
+                    self._chunks.popitem(last=False)
+            else:
+                self._chunks.move_to_end(chunk_idx)
+        return chunk[offset]
+
+    def _seek(self, i: int):
+        if i == self._next_pos:
+            return
+        keyframe = self.index.keyframe_before(i)
+        if not keyframe <= self._next_pos < i:
+            # landing exactly on a keyframe is cheap, the rest of the GOP is grabbed below
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+            self._next_pos = keyframe
+        while self._next_pos < i and self._cap.grab():
+            self._next_pos += 1
+
+    def _read(self) -> np.ndarray | None:
+        ret, frame = self._cap.read()
+        if not ret:
+            return None
+        self._next_pos += 1
+        return frame
+
+    def _decode_chunk(self, chunk_idx: int) -> np.ndarray:
+        start = chunk_idx * self.chunk_size
+        stop = min(start + self.chunk_size, len(self))
+        _, height, width, _ = self.shape
+
+        chunk = np.zeros((stop - start, height, width, 3), dtype=self.dtype)
+        self._seek(start)
+        for j in range(stop - start):
+            frame = self._read()
+            if frame is None:
+                # container reported more frames than it holds, repeat the last good one
+                if j > 0:
+                    chunk[j:] = chunk[j - 1]
+                break
+            chunk[j] = frame
+        return chunk
+
+    def thumbnails(self, size: tuple[int, int]) -> np.ndarray:
+        """Every frame shrunk to `size` (width, height), as one uint8 array.
+
+        Decodes the video once, front to back, with a capture of its own, so it neither
+        waits on nor evicts the chunks cached for random access.
+        """
+        width, height = size
+        thumbs = np.zeros((len(self), height, width, 3), dtype=self.dtype)
+        cap = cv2.VideoCapture(self.path)
+        try:
+            for i in range(len(self)):
+                ret, frame = cap.read()
+                if not ret:
+                    if i > 0:
+                        thumbs[i:] = thumbs[i - 1]
+                    break
+                thumbs[i] = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        finally:
+            cap.release()
+        return thumbs
+
+    def close(self):
+        with self._lock:
+            self._cap.release()
+            self._chunks.clear()
@@ -0,0 +1,109 @@
+import numpy as np
+
+
+class LabelVolume:
+    """Per-frame label store of shape (T, H, W) holding small integer labels as uint8.
+
+    Each frame is its own chunk, allocated on first write. Frames that were never
+    written or that are entirely zero have no storage, so a long clip with a few
+    annotated frames costs only those frames. Reads return read-only arrays, every
+    write goes through item assignment. Supports the indexing used on the
+    `np.ndarray` it replaces in `Model.video_label`:
+
+        label = volume[t]            # (H, W) uint8, read-only, zeros if untouched
+        volume[t] = 0 / mask         # whole-frame write
+        volume[ts, ys, xs] = value   # scattered pixel writes
+    """
+
+    def __init__(self, num_frames: int, height: int, width: int, dtype=np.uint8):
+        self.shape = (num_frames, height, width)
+        self.dtype = np.dtype(dtype)
+        self.ndim = 3
+        self._frames: dict[int, np.ndarray] = {}
+        self._zeros = np.zeros(self.shape[1:], dtype=self.dtype)
+        self._zeros.flags.writeable = False
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def nbytes(self):
+        return sum(frame.nbytes for frame in self._frames.values())
+
+    def _frame_num(self, i) -> int:
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"frame index {i} out of range for {len(self)} frames")
+        return i
+
+    def _writable_frame(self, i: int) -> np.ndarray:
+        frame = self._frames.get(i)
+        if frame is None:
+            frame = self._frames[i] = np.zeros(self.shape[1:], dtype=self.dtype)
+        return frame
+
+    def _compact(self, i: int):
+        # only called after writes that may have zeroed the frame
+        frame = self._frames.get(i)
+        if frame is not None and not frame.any():
+            del self._frames[i]
+
+    def is_empty(self, i: int) -> bool:
+        return self._frame_num(i) not in self._frames
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            frame_key, rest = key[0], key[1:]
+            if np.ndim(frame_key) == 0 and not isinstance(frame_key, slice):
+                return self[frame_key][rest]
+            return np.asarray(self)[key]
+        if isinstance(key, slice):
+            return np.stack([self[i] for i in range(*key.indices(len(self)))])
+
+        i = self._frame_num(key)
+        frame = self._frames.get(i)
+        if frame is None:
+            return self._zeros
+        # a view, so writes have to go through __setitem__, which keeps frames compact
+        frame = frame.view()
+        frame.flags.writeable = False
+        return frame
+
+    def __setitem__(self, key, value):
+        if isinstance(key, tuple) and np.ndim(key[0]) > 0:
+            self._scatter(key, value)
+            return
+        if isinstance(key, tuple):
+            i = self._frame_num(key[0])
+            self._writable_frame(i)[key[1:]] = value
+            if not np.any(value):
+                self._compact(i)
+            return
+
+        i = self._frame_num(key)
+        if np.ndim(value) == 0 and value == 0:
+            self._frames.pop(i, None)
+            return
+        frame = self._writable_frame(i)
+        frame[...] = value
+        self._compact(i)
+
+    def _scatter(self, key, value):
+        frame_nums = np.asarray(key[0])
+        value = np.asarray(value)
+        for i in np.unique(frame_nums):
+            mask = frame_nums == i
+            frame_key = tuple(np.asarray(k)[mask] for k in key[1:])
+            frame_value = value if value.ndim == 0 else value[mask]
+            i = self._frame_num(i)
+            self._writable_frame(i)[frame_key] = frame_value
+            if not np.any(frame_value):
+                self._compact(i)
+
+    def __array__(self, dtype=None, copy=None):
+        volume = np.zeros(self.shape, dtype=self.dtype if dtype is None else dtype)
+        for i, frame in self._frames.items():
+            volume[i] = frame
+        return volume
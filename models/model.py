@@ -12,27 +12,30 @@ class RenderData:
     initial_image: np.ndarray | None = None
     initial_label: np.ndarray | None = None
 
+    # the part of the zoomed frame under the image frame, in buffers sized like it
     zoomed_image: np.ndarray | None = None
     zoomed_label: np.ndarray | None = None
-
-    moved_image: np.ndarray | None = None
-    moved_label: np.ndarray | None = None
+    colored_label: np.ndarray | None = None
 
     initial_image_frame: np.ndarray | None = None
-    initial_image_frame2: np.ndarray | None = None
-    image_frame: np.ndarray | None = None
 
 class Model(QtCore.QObject):
     render_data = RenderData()
     video_url = None
     video_data = None
+    flow = None
+    # bumped on every assignment, render jobs compare them instead of the label arrays
+    label_version = 0
+    polygon_version = 0
 
     key_frames_changed = QtCore.pyqtSignal(set)
-    image_frame_changed = QtCore.pyqtSignal(np.ndarray)
+    # the layers shown in the image frame: RGB video frame, premultiplied RGBA label overlay
+    image_layer_changed = QtCore.pyqtSignal(np.ndarray)
+    label_layer_changed = QtCore.pyqtSignal(np.ndarray)
     frame_num_changed = QtCore.pyqtSignal(int)
     zoom_ratio_changed = QtCore.pyqtSignal(int)
     coordinates_changed = QtCore.pyqtSignal(tuple)
-    video_label_changed = QtCore.pyqtSignal(np.ndarray)
+    video_label_changed = QtCore.pyqtSignal(object)
     video_polygon_label_changed = QtCore.pyqtSignal(dict)
     tool_name_changed = QtCore.pyqtSignal(str)
     tool_size_changed = QtCore.pyqtSignal(int)
@@ -67,6 +70,7 @@ class Model(QtCore.QObject):
     @video_label.setter
     def video_label(self, value):
         self._video_label = value
+        self.label_version += 1
         self.video_label_changed.emit(value)
     
     @property
@@ -77,16 +81,26 @@ class Model(QtCore.QObject):
     @video_polygon_label.setter
     def video_polygon_label(self, value):
         self._video_polygon_label = value
+        self.polygon_version += 1
         self.video_polygon_label_changed.emit(value)
 
     @property
-    def image_frame(self):
-        return self._image_frame
+    def image_layer(self):
+        return self._image_layer
+    
+    @image_layer.setter
+    def image_layer(self, value):
+        self._image_layer = value
+        self.image_layer_changed.emit(value)
+
+    @property
+    def label_layer(self):
+        return self._label_layer
     
-    @image_frame.setter
-    def image_frame(self, value):
-        self._image_frame = value
-        self.image_frame_changed.emit(value)
+    @label_layer.setter
+    def label_layer(self, value):
+        self._label_layer = value
+        self.label_layer_changed.emit(value)
     
     @property
     def frame_num(self):
@@ -153,7 +167,8 @@ class Model(QtCore.QObject):
 
     def __init__(self):
         super().__init__()
-        self._image_frame = np.zeros((1, 1, 3))
+        self._image_layer = np.zeros((1, 1, 3), dtype=np.uint8)
+        self._label_layer = np.zeros((1, 1, 4), dtype=np.uint8)
         self._key_frames = set()
         self._alpha = 50
         self._video_polygon_label = dict()
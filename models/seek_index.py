@@ -0,0 +1,88 @@
+import os
+
+import cv2
+import numpy as np
+
+
+class SeekIndex:
+    """Per-frame keyframe flags and timestamps of a video, persisted next to it.
+
+    Built once by scanning the container packets without decoding, then saved to
+    a `<video>.seekidx.npz` sidecar so re-opening the same file skips the scan.
+    """
+
+    SUFFIX = ".seekidx.npz"
+    VERSION = 1
+
+    def __init__(self, keyframes: np.ndarray, timestamps: np.ndarray):
+        self.keyframes = keyframes
+        self.timestamps = timestamps
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def keyframe_before(self, i: int) -> int:
+        """Index of the last keyframe at or before frame `i`."""
+        pos = np.searchsorted(self.keyframes, i, side="right") - 1
+        return int(self.keyframes[max(pos, 0)])
+
+    @staticmethod
+    def sidecar_path(path: str) -> str:
+        return path + SeekIndex.SUFFIX
+
+    @staticmethod
+    def _signature(path: str) -> np.ndarray:
+        stat = os.stat(path)
+        return np.array([SeekIndex.VERSION, stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+    @classmethod
+    def open(cls, path: str) -> "SeekIndex":
+        index = cls.load(path)
+        if index is None:
+            index = cls.build(path)
+            index.save(path)
+        return index
+
+    @classmethod
+    def load(cls, path: str) -> "SeekIndex | None":
+        try:
+            with np.load(cls.sidecar_path(path)) as data:
+                if not np.array_equal(data["signature"], cls._signature(path)):
+                    return None
+                return cls(data["keyframes"], data["timestamps"])
+        except Exception:
+            # missing, or truncated/corrupt (e.g. zipfile.BadZipFile): rebuild it
+            return None
+
+    @classmethod
+    def build(cls, path: str) -> "SeekIndex":
+        cap = cv2.VideoCapture(path, cv2.CAP_FFMPEG)
+        # raw mode: grab() only demuxes packets, nothing is decoded
+        raw = cap.set(cv2.CAP_PROP_FORMAT, -1)
+
+        keyframes, timestamps = [], []
+        while cap.grab():
+            if not raw or cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                keyframes.append(len(timestamps))
+            timestamps.append(cap.get(cv2.CAP_PROP_POS_MSEC))
+        cap.release()
+
+        if not keyframes:
+            keyframes = [0]
+        return cls(np.array(keyframes, dtype=np.int64), np.array(timestamps, dtype=np.float64))
+
+    def save(self, path: str):
+        sidecar = self.sidecar_path(path)
+        # written under a temporary name and renamed, readers never see a partial file
+        tmp_path = f"{sidecar}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, signature=self._signature(path), keyframes=self.keyframes, timestamps=self.timestamps)
+            os.replace(tmp_path, sidecar)
+        except OSError as e:
+            # read-only media, keep the in-memory index only
+            print(f"Could not write seek index for {path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
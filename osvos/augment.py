@@ -0,0 +1,82 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+MEANVAL = (104.00699, 116.66877, 122.67892)
+
+
+class AugmentationBank(object):
+    """Randomly flipped, rotated and scaled copies of one annotated frame, served in mini-batches.
+
+    `size` augmentations are generated at once with `affine_grid`/`grid_sample` on the
+    training device (bicubic for the image, nearest for the mask) and handed out in a
+    shuffled order; a fresh bank is drawn when it runs out. The image is mean-subtracted
+    once, so warped-in borders are zero as with `custom_transforms.ScaleNRotate`.
+    """
+
+    def __init__(
+        self, img, label, device, size=16, rots=(-30, 30), scales=(0.75, 1.25), flip=True, seed=0, meanval=MEANVAL
+    ):
+        self.size = size
+        self.rots = rots
+        self.scales = scales
+        self.flip = flip
+        self.generator = torch.Generator().manual_seed(seed)
+
+        image = torch.from_numpy(np.ascontiguousarray(img, dtype=np.float32)).to(device)
+        image = image - torch.tensor(meanval, dtype=torch.float32, device=device)
+        self.image = image.permute(2, 0, 1).unsqueeze(0)
+
+        gt = np.array(label, dtype=np.float32)
+        if gt.ndim == 2:
+            gt = gt[:, :, np.newaxis]
+        gt = gt / np.max([gt.max(), 1e-8])
+        self.gt = torch.from_numpy(gt).float().to(device).permute(2, 0, 1).unsqueeze(0)
+
+        self.images = None
+        self.gts = None
+        self._order = []
+
+    def _uniform(self, low_high, n):
+        low, high = low_high
+        return low + (high - low) * torch.rand(n, generator=self.generator, dtype=torch.float64)
+
+    def thetas(self, n):
+        """`n` random affine matrices in the normalised coordinates of `affine_grid`."""
+        height, width = self.image.shape[-2:]
+        rot = torch.deg2rad(self._uniform(self.rots, n))
+        sc = self._uniform(self.scales, n)
+        cos, sin = torch.cos(rot) / sc, torch.sin(rot) / sc
+
+        # inverse of cv2.getRotationMatrix2D(center, rot, sc): output pixel -> input pixel,
+        # rescaled from pixels to [-1, 1] along each axis
+        theta = torch.zeros(n, 2, 3, dtype=torch.float64)
+        theta[:, 0, 0] = cos
+        theta[:, 0, 1] = -sin * height / width
+        theta[:, 1, 0] = sin * width / height
+        theta[:, 1, 1] = cos
+        if self.flip:
+            flipped = torch.rand(n, generator=self.generator) < 0.5
+            theta[flipped, 0, :2] *= -1
+        return theta.float()
+
+    def refill(self):
+        theta = self.thetas(self.size).to(self.image.device)
+        shape = (self.size, self.image.shape[1], *self.image.shape[-2:])
+        grid = F.affine_grid(theta, shape, align_corners=False)
+        n = self.size
+        self.images = F.grid_sample(
+            self.image.expand(n, -1, -1, -1), grid, mode="bicubic", padding_mode="zeros", align_corners=False
+        )
+        self.gts = F.grid_sample(
+            self.gt.expand(n, -1, -1, -1), grid, mode="nearest", padding_mode="zeros", align_corners=False
+        )
+        self._order = torch.randperm(n, generator=self.generator).tolist()
+
+    def sample(self, batch_size):
+        """The next `batch_size` augmentations as (images, gts), each N x C x H x W."""
+        if len(self._order) < batch_size:
+            self.refill()
+        idx = self._order[:batch_size]
+        del self._order[:batch_size]
+        return self.images[idx], self.gts[idx]
@@ -0,0 +1,190 @@
+import copy
+import os
+import tempfile
+import timeit
+
+import torch
+import torch.nn as nn
+
+
+class FusedHead(nn.Module):
+    """`OSVOS.forward_fused` as the `forward` of a module, for tracing and export."""
+
+    def __init__(self, net):
+        super(FusedHead, self).__init__()
+        self.net = net
+
+    def forward(self, x):
+        return self.net.forward_fused(x)
+
+
+class TorchScriptGraph(object):
+    """A frozen TorchScript graph standing in for a network in `osvos.main.predict`."""
+
+    def __init__(self, module):
+        self.module = module
+
+    def to(self, *args, **kwargs):
+        return self
+
+    def forward_fused(self, x):
+        return self.module(x).float()
+
+
+class OnnxGraph(object):
+    """An ONNX Runtime session standing in for a network in `osvos.main.predict` (CPU only)."""
+
+    def __init__(self, session):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+
+    def to(self, *args, **kwargs):
+        return self
+
+    def forward_fused(self, x):
+        (out,) = self.session.run(None, {self.input_name: x.contiguous().cpu().numpy()})
+        return torch.from_numpy(out).to(x.device)
+
+
+class Export(object):
+    """How to compile a fine-tuned OSVOS network for the inference pass.
+
+    `backend` is "torchscript" or "onnx" (needs `onnx` and `onnxruntime`). `quantize`
+    applies int8 static quantization, calibrated on the first frame, and
+    `bf16` traces under bfloat16 autocast; both are CPU-only and TorchScript-only.
+    A compiled graph is only used when, on the frames of the first batch not used for
+    calibration, each label's mask has an IoU of at least `min_iou` with the eager
+    network's. Compiling takes seconds, so `osvos.main.predict` only compiles when at
+    least `min_frames` frames remain to be segmented.
+    """
+
+    def __init__(self, backend="torchscript", quantize=False, bf16=False, min_iou=0.9, min_frames=24):
+        if backend not in ("torchscript", "onnx"):
+            raise ValueError("Unknown export backend %r" % backend)
+        if backend == "onnx" and (quantize or bf16):
+            raise ValueError("int8 and bf16 are only supported with the torchscript backend")
+        self.backend = backend
+        self.quantize = quantize
+        self.bf16 = bf16
+        self.min_iou = min_iou
+        self.min_frames = min_frames
+
+    def _quantized(self, head, example):
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+        prepared = prepare_fx(head, get_default_qconfig_mapping("x86"), (example,))
+        with torch.no_grad():
+            prepared(example)
+        return convert_fx(prepared)
+
+    def _torchscript(self, head, example):
+        with torch.no_grad(), torch.autocast("cpu", dtype=torch.bfloat16, enabled=self.bf16):
+            module = torch.jit.trace(head, example, check_trace=False)
+        return TorchScriptGraph(torch.jit.freeze(module.eval()))
+
+    def _onnx(self, head, example):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("The onnx export backend needs the onnx and onnxruntime packages")
+
+        fd, path = tempfile.mkstemp(suffix=".onnx")
+        os.close(fd)
+        try:
+            torch.onnx.export(
+                head,
+                (example.contiguous(),),
+                path,
+                input_names=["image"],
+                output_names=["logits"],
+                dynamic_axes={"image": {0: "batch"}, "logits": {0: "batch"}},
+                dynamo=False,
+            )
+            session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+        finally:
+            os.remove(path)
+        return OnnxGraph(session)
+
+    def compile(self, net, example, expected=None, threshold=0.9):
+        """A compiled copy of `net` for inputs shaped like `example` (but any batch size).
+
+        The first frame of `example` calibrates and traces the graph, the others check its
+        parity against `expected`, the eager logits for `example`, computed here if not
+        given. Returns None, and the caller keeps the eager network, when compilation is
+        not possible on this device or the graph fails the check.
+        """
+        if example.device.type != "cpu":
+            print("OSVOS export is CPU-only, running eagerly on %s" % example.device)
+            return None
+        if len(example) < 2:
+            print("OSVOS export needs a batch of at least 2 frames to check the graph, running eagerly")
+            return None
+
+        start_time = timeit.default_timer()
+        head = FusedHead(copy.deepcopy(net)).eval()
+        # one frame is enough to calibrate and trace, the graphs take any batch size
+        sample = example[:1]
+        try:
+            if self.quantize:
+                head = self._quantized(head, sample)
+            if self.backend == "onnx":
+                graph = self._onnx(head, sample)
+            else:
+                graph = self._torchscript(head, sample)
+        except Exception as e:
+            print("OSVOS export failed, running eagerly: %s" % e)
+            return None
+
+        if expected is None:
+            with torch.inference_mode():
+                expected = net.forward_fused(example)
+        # frames the graph was not calibrated on
+        iou, max_diff = parity(expected[1:], graph, example[1:], threshold)
+        print(
+            "OSVOS export (%s) in %.1fs: lowest label IoU %.4f, max probability difference %.4f"
+            % (self, timeit.default_timer() - start_time, iou, max_diff)
+        )
+        if iou < self.min_iou:
+            print("OSVOS export does not match the eager network, running eagerly")
+            return None
+        return graph
+
+    def __repr__(self):
+        return "+".join([self.backend] + ["int8"] * self.quantize + ["bf16"] * self.bf16)
+
+
+def label_map(logits, threshold=0.9):
+    """Per pixel, 1 + the most probable output channel, or 0 when none is above `threshold`."""
+    prob, channel = torch.sigmoid(logits).max(dim=1)
+    return torch.where(prob > threshold, channel + 1, 0)
+
+
+def parity(expected, graph, inputs, threshold=0.9):
+    """Lowest IoU, over the output labels, between the masks of `graph` and those of the
+    `expected` logits, and the largest difference in probability.
+
+    IoU rather than pixel agreement, so a small object lost against a large background
+    still counts. A label neither marks anywhere has an IoU of 1.
+    """
+    with torch.inference_mode():
+        actual = graph.forward_fused(inputs)
+        expected_map, actual_map = label_map(expected, threshold), label_map(actual, threshold)
+        ious = []
+        for c in range(1, expected.shape[1] + 1):
+            e, a = expected_map == c, actual_map == c
+            union = (e | a).sum().item()
+            ious.append((e & a).sum().item() / union if union else 1.0)
+        max_diff = (torch.sigmoid(expected) - torch.sigmoid(actual)).abs().max().item()
+    return min(ious), max_diff
+
+
+EXPORTS = {
+    "eager": None,
+    "torchscript": Export("torchscript"),
+    "torchscript int8": Export("torchscript", quantize=True),
+    "torchscript bf16": Export("torchscript", bf16=True),
+    "onnx": Export("onnx"),
+}
+# int8 trades accuracy for speed, it is opt-in (MainController.osvos_export / RunView)
+DEFAULT_EXPORT = "eager"
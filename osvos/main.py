@@ -1,5 +1,6 @@
 from __future__ import division
 
+import itertools
 import timeit
 
 import numpy as np
@@ -7,14 +8,13 @@ import numpy as np
 # PyTorch includes
 import torch
 import torch.optim as optim
-from torch.utils.data import DataLoader
-from torchvision import transforms
 from tqdm import trange
 
 # Custom includes
-import osvos.custom_transforms as tr
-import osvos.davis_2016 as db
-import osvos.vgg_osvos as vo
+from osvos.augment import MEANVAL, AugmentationBank
+from osvos.model_manager import default_manager
+from osvos.schedule import DEFAULT_SCHEDULE, SCHEDULES
+from osvos.weights_cache import WeightsCache
 
 
 def class_balanced_cross_entropy_loss(output, label, size_average=True, batch_average=True):
@@ -50,42 +50,29 @@ def class_balanced_cross_entropy_loss(output, label, size_average=True, batch_av
     return final_loss
 
 
-def run(img, label, test_img_list):
-    parent_model_path = "C:\\Uni\\Proj\\vidsegtool\\osvos\\models\\parent_epoch-239.pth"
-
-    nAveGrad = 1  # Average the gradient every nAveGrad iterations
-    nEpochs = 200 * nAveGrad  # Number of epochs for training
-    snapshot = nEpochs  # Store a model every snapshot epochs
-    # parentEpoch = 240
-
-    seed = 0
+def multi_label_loss(output, gts):
+    """Sum of the class balanced losses of each label channel, averaged over the batch."""
+    return sum(
+        class_balanced_cross_entropy_loss(output[:, c : c + 1], gts[:, c : c + 1], size_average=False)
+        for c in range(output.size()[1])
+    )
 
-    # Select which GPU, -1 if CPU
-    gpu_id = 0
-    device = torch.device("cuda:" + str(gpu_id) if torch.cuda.is_available() else "cpu")
-    print(device)
-    # Network definition
-    net = vo.OSVOS(pretrained=0)
-    net.load_state_dict(torch.load(parent_model_path, map_location=lambda storage, loc: storage))
 
-    # Logging into Tensorboard
-    # log_dir = os.path.join(
-    #     save_dir, "runs", datetime.now().strftime("%b%d_%H-%M-%S") + "_" + socket.gethostname() + "-" + seq_name
-    # )
-    # writer = SummaryWriter(log_dir=log_dir)
+def label_channels(label, label_ids):
+    """One 0/1 float channel per id in `label_ids` from a map of annotation label ids (H x W x n)."""
+    return np.stack([label == label_id for label_id in label_ids], axis=-1).astype(np.float32)
 
-    net.to(device)  # PyTorch 0.4.0 style
 
-    # Use the following optimizer
-    lr = 1e-8
-    wd = 0.0002
-    optimizer = optim.SGD(
+def make_optimizer(net, lr, wd, frozen_stages=0):
+    """SGD over the trainable parameters; the first `frozen_stages` VGG stages are left out."""
+    stages = net.stages[frozen_stages:]
+    return optim.SGD(
         [
             {
-                "params": [pr[1] for pr in net.stages.named_parameters() if "weight" in pr[0]],
+                "params": [pr[1] for pr in stages.named_parameters() if "weight" in pr[0]],
                 "weight_decay": wd,
             },
-            {"params": [pr[1] for pr in net.stages.named_parameters() if "bias" in pr[0]], "lr": lr * 2},
+            {"params": [pr[1] for pr in stages.named_parameters() if "bias" in pr[0]], "lr": lr * 2},
             {
                 "params": [pr[1] for pr in net.side_prep.named_parameters() if "weight" in pr[0]],
                 "weight_decay": wd,
@@ -100,89 +87,276 @@ def run(img, label, test_img_list):
         momentum=0.9,
     )
 
-    # Preparation of the data loaders
-    # Define augmentation transformations as a composition
-    composed_transforms = transforms.Compose(
-        [tr.RandomHorizontalFlip(), tr.ScaleNRotate(rots=(-30, 30), scales=(0.75, 1.25)), tr.ToTensor()]
-    )
-    # Training dataset and its iterator
-    db_train = db.DAVIS2016(train=True, img_list=[img], labels=[label], transform=composed_transforms)
-    trainloader = DataLoader(db_train, batch_size=1, shuffle=True, num_workers=0)
 
-    # Testing dataset and its iterator
-    db_test = db.DAVIS2016(
-        train=False, img_list=test_img_list, labels=[None] * len(test_img_list), transform=tr.ToTensor()
-    )
-    testloader = DataLoader(db_test, batch_size=1, shuffle=False, num_workers=0)
+def train_online(
+    net, img, gt, device, schedule, nAveGrad, seed, lr, wd, progress=None, bank_size=16, batch_size=4
+):
+    """Fine-tune `net` in place on a single annotated frame, for as long as `schedule` allows.
+
+    `gt` holds one mask channel per output channel of `net` (see `label_channels`).
+
+    Each epoch is one forward/backward pass over `batch_size` augmentations drawn from an
+    `AugmentationBank` of `bank_size`.
+    Returns the schedule's `Tracker`, which records how many epochs ran and why training stopped.
+    """
+    # Use the following optimizer
+    optimizer = make_optimizer(net, lr, wd, schedule.frozen_stages)
+
+    # Flipped, rotated and scaled copies of the key frame, generated on the device in batches
+    bank = AugmentationBank(img, gt, device, size=bank_size, rots=(-30, 30), scales=(0.75, 1.25), seed=seed)
 
-    num_img_tr = len(trainloader)
-    num_img_ts = len(testloader)
     aveGrad = 0
+    nEpochs = schedule.max_epochs
+    print_every = max(nEpochs // 20, 1)
+    tracker = schedule.tracker()
 
     print("Start of Online Training")
     start_time = timeit.default_timer()
-    # Main Training and Testing Loop
+    # Main Training Loop
     for epoch in trange(0, nEpochs):
-        # One training epoch
-        running_loss_tr = 0
-        np.random.seed(seed + epoch)
-        for ii, sample_batched in enumerate(trainloader):
-
-            inputs, gts = sample_batched["image"], sample_batched["gt"]
-
-            # Forward-Backward of the mini-batch
-            inputs.requires_grad_()
-            inputs, gts = inputs.to(device), gts.to(device)
+        inputs, gts = bank.sample(batch_size)
 
-            outputs = net.forward(inputs)
+        # Forward-Backward of the mini-batch
+        outputs = net.forward(inputs, schedule.frozen_stages)
 
-            # Compute the fuse loss
-            loss = class_balanced_cross_entropy_loss(outputs[-1], gts, size_average=False)
-            running_loss_tr += loss.item()  # PyTorch 0.4.0 style
+        # Compute the fuse loss, averaged over the mini-batch
+        loss = multi_label_loss(outputs[-1], gts)
+        running_loss_tr = loss.item()
 
-            # Print stuff
-            if epoch % (nEpochs // 20) == (nEpochs // 20 - 1):
-                running_loss_tr /= num_img_tr
-                print("[Epoch: %d, numImages: %5d]" % (epoch + 1, ii + 1))
-                print("Loss: %f" % running_loss_tr)
+        # Print stuff
+        if epoch % print_every == print_every - 1:
+            print("[Epoch: %d, numImages: %5d]" % (epoch + 1, batch_size))
+            print("Loss: %f" % running_loss_tr)
 
-            # Backward the averaged gradient
-            loss /= nAveGrad
-            loss.backward()
-            aveGrad += 1
+        # Backward the averaged gradient
+        loss /= nAveGrad
+        loss.backward()
+        aveGrad += 1
 
-            # Update the weights once in nAveGrad forward passes
-            if aveGrad % nAveGrad == 0:
-                optimizer.step()
-                optimizer.zero_grad()
-                aveGrad = 0
+        # Update the weights once in nAveGrad forward passes
+        if aveGrad % nAveGrad == 0:
+            optimizer.step()
+            optimizer.zero_grad()
+            aveGrad = 0
 
-        # Save the model
-        # if (epoch % snapshot) == snapshot - 1 and epoch != 0:
-        #     torch.save(net.state_dict(), os.path.join(save_dir, seq_name + "_epoch-" + str(epoch) + ".pth"))
+        stop = tracker.update(running_loss_tr)
+        if progress is not None:
+            progress(tracker.fraction())
+        if stop:
+            break
 
     stop_time = timeit.default_timer()
-    print("Online training time: " + str(stop_time - start_time))
-
-    test_label_list = []
-
-    print("Testing Network")
-    with torch.no_grad():  # PyTorch 0.4.0 style
-        # Main Testing Loop
-        for ii, sample_batched in enumerate(testloader):
+    print(
+        "Online training time: %s (%d epochs, stopped on %s)"
+        % (stop_time - start_time, tracker.epoch, tracker.reason)
+    )
+    return tracker
 
-            img = sample_batched["image"]
 
-            # Forward of the mini-batch
-            inputs = img.to(device)
+def hyperparameters(schedule=None, init=None, manager=None):
+    """The effective fine-tuning schedule and the hyperparameters that identify a fine-tuned network.
 
-            outputs = net.forward(inputs)
+    Starting from already fine-tuned weights (`init`, a weights-cache key) uses a
+    shortened `schedule`. The hyperparameters record `init`, so a chain of warm
+    starts can be traced back to the parent model (see `WeightsCache.lineage`).
+    """
+    if manager is None:
+        manager = default_manager()
+    if schedule is None:
+        schedule = SCHEDULES[DEFAULT_SCHEDULE]
+    if init is not None:
+        schedule = schedule.shortened()
+
+    hparams = dict(
+        parent=manager.parent_model_path,
+        init=init,
+        schedule=schedule.params(),
+        nAveGrad=1,  # Average the gradient every nAveGrad iterations
+        bank_size=16,  # Augmented copies of the key frame generated at once
+        train_batch_size=4,  # Augmentations per training step
+        seed=0,
+        # the original 1e-8 / 0.0002, adjusted for a loss that no longer counts each mask three times
+        lr=3e-8,
+        wd=0.0002 / 3,
+    )
+    return schedule, hparams
+
+
+def finetune_key(img, label, schedule=None, init=None, manager=None):
+    """Weights-cache key of the network `run` fine-tunes on `img`/`label`."""
+    _, hparams = hyperparameters(schedule, init, manager)
+    return WeightsCache.key(img, np.asarray(label), hparams)
+
+
+def _init_weights(init, cache, manager):
+    net = manager.warm(init)
+    if net is not None:
+        return net.state_dict()
+    return cache.get(init) if cache is not None else None
+
+
+def _load_compatible(net, state_dict):
+    # a network fine-tuned for another number of labels still shares everything but the fused head
+    own = net.state_dict()
+    state_dict = {k: v for k, v in state_dict.items() if k in own and v.shape == own[k].shape}
+    net.load_state_dict(state_dict, strict=False)
+
+
+def run(
+    img,
+    label,
+    test_img_list,
+    progress=None,
+    cache=None,
+    manager=None,
+    batch_size=4,
+    threshold=0.9,
+    num_test=None,
+    schedule=None,
+    init=None,
+    export=None,
+    finished=None,
+):
+    """Fine-tune the parent network on `img`/`label` and yield a uint8 label map per test image.
+
+    `label`: the key frame's map of label ids, all learned together (0 is background).
+    `init`: weights-cache key of a fine-tuned network to warm-start from.
+    `export`: an `osvos.export.Export` to compile the network with for inference.
+    `finished`: called with the weights key once every test image is done.
+    """
+    if manager is None:
+        manager = default_manager()
+    if num_test is None:
+        num_test = len(test_img_list)
+    test_progress = (lambda f: progress(0.9 + 0.1 * f)) if progress is not None else None
+
+    init_state = _init_weights(init, cache, manager) if init is not None else None
+    if init is not None and init_state is None:
+        print("Weights %s to warm-start from are gone, fine-tuning from the parent" % init)
+        init = None
+    schedule, hparams = hyperparameters(schedule, init, manager)
+
+    label = np.asarray(label)
+    label_ids = [int(i) for i in np.unique(label) if i != 0]
+    if not label_ids:
+        print("Key frame has no labels")
+        label_ids = [1]
+
+    device = manager.device
+    print(device)
 
-            for jj in range(int(inputs.size()[0])):
-                pred = np.transpose(outputs[-1].cpu().data.numpy()[jj, :, :, :], (1, 2, 0))
-                pred = 1 / (1 + np.exp(-pred))
-                pred = np.squeeze(pred)
+    key = WeightsCache.key(img, label, hparams)
+
+    net = manager.warm(key)
+    if net is not None:
+        print("Using resident fine-tuned network")
+    else:
+        # Network definition: a copy of the resident parent, no re-initialisation or checkpoint load
+        net = manager.clone(len(label_ids))
+
+        state_dict = cache.get(key) if cache is not None else None
+        if state_dict is not None:
+            print("Using cached fine-tuned weights")
+            net.load_state_dict(state_dict)
+        else:
+            if init_state is not None:
+                print("Warm-starting from fine-tuned weights %s" % init)
+                _load_compatible(net, init_state)
+            train_progress = (lambda f: progress(0.9 * f)) if progress is not None else None
+            train_online(
+                net,
+                img,
+                label_channels(label, label_ids),
+                device,
+                schedule,
+                hparams["nAveGrad"],
+                hparams["seed"],
+                hparams["lr"],
+                hparams["wd"],
+                train_progress,
+                hparams["bank_size"],
+                hparams["train_batch_size"],
+            )
+            if cache is not None:
+                cache.put(key, net.state_dict(), hparams)
+        manager.keep_warm(key, net)
+
+    graph = manager.compiled(key, export) if export is not None else None
+    compiled = yield from predict(
+        net, test_img_list, device, batch_size, threshold, test_progress, num_test, label_ids, export, graph
+    )
+    if compiled is not None:
+        manager.keep_compiled(key, export, compiled)
+    if finished is not None:
+        finished(key)
+
+
+def predict(
+    net,
+    images,
+    device,
+    batch_size=4,
+    threshold=0.9,
+    progress=None,
+    num_images=None,
+    label_ids=(1,),
+    export=None,
+    graph=None,
+):
+    """Segment `images` (H x W x 3 arrays of one size) with `net`, yielding a uint8 label map per image.
+
+    Each pixel gets the id in `label_ids` of the most probable output channel, or 0 when
+    no channel's probability is above `threshold`.
+    Frames are read lazily and pushed through the network `batch_size` at a time, so
+    `images` may be a generator; pass `num_images` with one to get progress reports.
+    With an `Export`, the network is compiled on the first batch and the compiled graph
+    runs the rest, unless it fails its parity check against `net` or fewer than
+    `export.min_frames` frames remain. `graph` is a graph compiled by an earlier call, used
+    from the start; False means an earlier compile was rejected and `net` runs eagerly.
+    Returns the compiled graph, False if it was rejected, or None if none was compiled.
+    """
+    if num_images is None:
+        num_images = len(images)
+    label_ids = torch.tensor([0, *label_ids], dtype=torch.uint8, device=device)
+    meanval = torch.tensor(MEANVAL, dtype=torch.float32, device=device)
+    net = net.to(device, memory_format=torch.channels_last)
+    compiled = None
+    if graph is not None:
+        net = graph or net
+        export = None
 
-                test_label_list.append(pred)
+    print("Testing Network")
+    start_time = timeit.default_timer()
+    done = 0
+    images = iter(images)
+    with torch.inference_mode():
+        while True:
+            batch = list(itertools.islice(images, batch_size))
+            if not batch:
+                break
+
+            inputs = torch.from_numpy(np.stack(batch)).to(device)
+            inputs = (inputs.float() - meanval).permute(0, 3, 1, 2)
+            inputs = inputs.contiguous(memory_format=torch.channels_last)
+
+            logits = net.forward_fused(inputs)
+            if export is not None and num_images - done - len(batch) >= export.min_frames:
+                # compiled after the eager pass on the first batch, which the parity check reuses
+                with torch.inference_mode(False):
+                    compiled = export.compile(net, inputs.clone(), logits.clone(), threshold) or False
+                net = compiled or net
+            export = None
+
+            prob, channel = torch.sigmoid(logits).max(dim=1)
+            masks = label_ids[torch.where(prob > threshold, channel + 1, 0)]
+            for mask in masks.cpu().numpy():
+                yield mask
+
+            done += len(batch)
+            if progress is not None and num_images:
+                progress(done / num_images)
 
-    return test_label_list
+    stop_time = timeit.default_timer()
+    if done:
+        print("Inference: %.2f frames/s" % (done / (stop_time - start_time)))
+    return compiled
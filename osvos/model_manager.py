@@ -0,0 +1,100 @@
+import copy
+import os
+import threading
+from collections import OrderedDict
+
+import torch
+
+import osvos.vgg_osvos as vo
+
+DEFAULT_PARENT_MODEL_PATH = os.environ.get(
+    "OSVOS_PARENT_MODEL", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "parent_epoch-239.pth")
+)
+
+
+def load_state_dict(path):
+    """Load a checkpoint on the CPU, memory-mapping the file where torch supports it."""
+    try:
+        return torch.load(path, map_location="cpu", mmap=True)
+    except (TypeError, RuntimeError):
+        # older torch, or a legacy (non-zip) checkpoint that cannot be mapped
+        return torch.load(path, map_location=lambda storage, loc: storage)
+
+
+class ModelManager:
+    """Long-lived holder of the OSVOS parent network and recently fine-tuned copies.
+
+    The parent checkpoint is loaded once, on first use. Fine-tuning starts from a
+    `clone` of the resident parent instead of constructing and initialising a new
+    network, and the `max_warm` most recently fine-tuned networks stay resident so a
+    repeat run on the same key frame goes straight to inference. So do their graphs
+    compiled for inference (see `osvos.export`), for as long as the network itself.
+    """
+
+    def __init__(self, parent_model_path=DEFAULT_PARENT_MODEL_PATH, device=None, max_warm=4):
+        self.parent_model_path = parent_model_path
+        if device is None:
+            device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+        self.device = device
+        self.max_warm = max_warm
+
+        self._parent = None
+        self._warm = OrderedDict()
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def parent(self):
+        with self._lock:
+            if self._parent is None:
+                net = vo.OSVOS(pretrained=0)
+                net.load_state_dict(load_state_dict(self.parent_model_path))
+                self._parent = net.to(self.device)
+            return self._parent
+
+    def clone(self, num_labels=1):
+        """A trainable copy of the parent network, already on `device`, predicting `num_labels` masks."""
+        parent = self.parent()
+        with self._lock:
+            net = copy.deepcopy(parent)
+        if num_labels != 1:
+            net.set_num_labels(num_labels)
+        return net
+
+    def warm(self, key):
+        with self._lock:
+            net = self._warm.get(key)
+            if net is not None:
+                self._warm.move_to_end(key)
+            return net
+
+    def keep_warm(self, key, net):
+        with self._lock:
+            self._warm[key] = net
+            self._warm.move_to_end(key)
+            while len(self._warm) > self.max_warm:
+                evicted, _ = self._warm.popitem(last=False)
+                self._compiled = {k: g for k, g in self._compiled.items() if k[0] != evicted}
+
+    def compiled(self, key, export):
+        """The graph `export` compiled from the resident network `key`: None if it was never
+        compiled, False if compiling failed or the graph failed its parity check."""
+        with self._lock:
+            return self._compiled.get((key, repr(export)))
+
+    def keep_compiled(self, key, export, graph):
+        with self._lock:
+            if key in self._warm:
+                self._compiled[(key, repr(export))] = graph
+
+
+_default_manager = None
+_default_lock = threading.Lock()
+
+
+def default_manager():
+    """The process-wide manager used when `osvos.main.run` is not given one."""
+    global _default_manager
+    with _default_lock:
+        if _default_manager is None:
+            _default_manager = ModelManager()
+        return _default_manager
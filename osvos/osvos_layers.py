@@ -56,6 +56,11 @@ def center_crop(x, height, width):
     )
 
 
+def center_crop_like(x, ref):
+    """`center_crop` of `x` to the height and width of `ref`."""
+    return center_crop(x, int(ref.size()[-2]), int(ref.size()[-1]))
+
+
 def upsample_filt(size):
     factor = (size + 1) // 2
     if size % 2 == 1:
@@ -0,0 +1,116 @@
+import time
+
+
+class Schedule(object):
+    """How much of the network to fine-tune, and when to stop.
+
+    The first `frozen_stages` VGG stages keep their parent weights and are run without
+    autograd, which makes each step cheaper. Training ends after `max_epochs`, once
+    `time_budget` seconds have passed (if set), or when the smoothed loss has not
+    improved by a relative `min_delta` for `patience` epochs (if set, and not before
+    `min_epochs`).
+    """
+
+    def __init__(
+        self,
+        max_epochs=200,
+        time_budget=None,
+        patience=None,
+        min_delta=0.01,
+        min_epochs=20,
+        smoothing=0.1,
+        frozen_stages=0,
+    ):
+        self.max_epochs = max_epochs
+        self.time_budget = time_budget
+        self.patience = patience
+        self.min_delta = min_delta
+        self.min_epochs = min_epochs
+        self.smoothing = smoothing
+        self.frozen_stages = frozen_stages
+
+    def params(self):
+        return dict(
+            max_epochs=self.max_epochs,
+            time_budget=self.time_budget,
+            patience=self.patience,
+            min_delta=self.min_delta,
+            min_epochs=self.min_epochs,
+            smoothing=self.smoothing,
+            frozen_stages=self.frozen_stages,
+        )
+
+    def __repr__(self):
+        return "Schedule(%s)" % ", ".join("%s=%r" % kv for kv in self.params().items())
+
+    def shortened(self, factor=4):
+        """The same schedule with its epoch, time and patience limits divided by `factor`.
+
+        Used when fine-tuning starts from an already fine-tuned network rather than the parent.
+        """
+        params = self.params()
+        params["max_epochs"] = max(1, self.max_epochs // factor)
+        params["min_epochs"] = self.min_epochs // factor
+        if self.time_budget is not None:
+            params["time_budget"] = self.time_budget / factor
+        if self.patience is not None:
+            params["patience"] = max(1, self.patience // factor)
+        return Schedule(**params)
+
+    def tracker(self):
+        return Tracker(self)
+
+
+class Tracker(object):
+    """Progress of one fine-tuning run against its `Schedule`."""
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self.epoch = 0
+        self.start_time = time.monotonic()
+        self.smoothed = None
+        self.best = float("inf")
+        self.stale = 0
+        self.reason = None
+
+    def elapsed(self):
+        return time.monotonic() - self.start_time
+
+    def fraction(self):
+        s = self.schedule
+        fraction = self.epoch / s.max_epochs
+        if s.time_budget:
+            fraction = max(fraction, self.elapsed() / s.time_budget)
+        return min(fraction, 1.0)
+
+    def update(self, loss):
+        """Record the loss of a finished epoch; returns True when training should stop."""
+        s = self.schedule
+        self.epoch += 1
+        if self.smoothed is None:
+            self.smoothed = loss
+        else:
+            self.smoothed += s.smoothing * (loss - self.smoothed)
+
+        if self.smoothed < self.best * (1 - s.min_delta):
+            self.best = self.smoothed
+            self.stale = 0
+        else:
+            self.stale += 1
+
+        if self.epoch >= s.max_epochs:
+            self.reason = "epoch limit"
+        elif s.time_budget is not None and self.elapsed() >= s.time_budget:
+            self.reason = "time budget"
+        elif s.patience is not None and self.epoch >= s.min_epochs and self.stale >= s.patience:
+            self.reason = "loss plateau"
+        return self.reason is not None
+
+
+SCHEDULES = {
+    "quick": Schedule(max_epochs=100, time_budget=10, patience=10, frozen_stages=2),
+    "normal": Schedule(max_epochs=200, time_budget=30, patience=20),
+    # the original fixed 200 epochs
+    "thorough": Schedule(max_epochs=200),
+}
+DEFAULT_SCHEDULE = "normal"
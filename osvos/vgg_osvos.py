@@ -6,7 +6,10 @@ import torch
 import torch.nn as nn
 import torch.nn.modules as modules
 
-from osvos.osvos_layers import center_crop, interp_surgery
+from osvos.osvos_layers import center_crop, center_crop_like, interp_surgery
+
+# a leaf for torch.fx, whose symbolic tracing cannot turn input sizes into crop offsets
+torch.fx.wrap("center_crop_like")
 
 
 class OSVOS(nn.Module):
@@ -56,14 +59,22 @@ class OSVOS(nn.Module):
         print("Initializing weights..")
         self._initialize_weights(pretrained)
 
-    def forward(self, x):
+    def forward(self, x, frozen_stages=0):
+        """Side outputs of every stage, fused output last.
+
+        The first `frozen_stages` stages run without autograd, for fine-tuning with their
+        weights fixed.
+        """
         crop_h, crop_w = int(x.size()[-2]), int(x.size()[-1])
-        x = self.stages[0](x)
+        grad = torch.is_grad_enabled()
+        with torch.set_grad_enabled(grad and frozen_stages < 1):
+            x = self.stages[0](x)
 
         side = []
         side_out = []
         for i in range(1, len(self.stages)):
-            x = self.stages[i](x)
+            with torch.set_grad_enabled(grad and i >= frozen_stages):
+                x = self.stages[i](x)
             side_temp = self.side_prep[i - 1](x)
             side.append(center_crop(self.upscale[i - 1](side_temp), crop_h, crop_w))
             side_out.append(
@@ -75,6 +86,32 @@ class OSVOS(nn.Module):
         side_out.append(out)
         return side_out
 
+    def forward_fused(self, x):
+        """Same as `forward(x)[-1]`, without computing the per-stage side outputs."""
+        image = x
+        x = self.stages[0](x)
+
+        side = []
+        for i in range(1, len(self.stages)):
+            x = self.stages[i](x)
+            side.append(center_crop_like(self.upscale[i - 1](self.side_prep[i - 1](x)), image))
+
+        return self.fuse(torch.cat(side, dim=1))
+
+    def set_num_labels(self, num_labels):
+        """Predict `num_labels` masks at once, one channel of the fused output each.
+
+        The fused head is replaced by `num_labels` copies of its first channel, so a
+        single-label parent starts every label from the same weights. The side outputs
+        are only used by the parent's offline training and stay single-channel.
+        """
+        fuse = nn.Conv2d(self.fuse.in_channels, num_labels, kernel_size=1, padding=0)
+        fuse = fuse.to(self.fuse.weight.device)
+        with torch.no_grad():
+            fuse.weight.copy_(self.fuse.weight[:1].expand_as(fuse.weight))
+            fuse.bias.copy_(self.fuse.bias[:1].expand_as(fuse.bias))
+        self.fuse = fuse
+
     def _initialize_weights(self, pretrained):
         for m in self.modules():
             if isinstance(m, nn.Conv2d):
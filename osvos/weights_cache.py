@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+
+class WeightsCache:
+    """Content-addressed on-disk cache of fine-tuned OSVOS state dicts.
+
+    The key hashes the key-frame image, its mask and the training hyperparameters, so
+    re-running OSVOS from an unchanged key frame can skip fine-tuning. The total size is
+    capped at `max_bytes`, evicting the least recently used entries.
+
+    torch is only imported when an entry is read or written, so the GUI can create
+    the cache at startup without loading it.
+    """
+
+    DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "vidsegtool", "osvos")
+
+    def __init__(self, cache_dir=DEFAULT_DIR, max_bytes=4 * 1024**3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(img, label, hparams):
+        h = hashlib.sha256()
+        for array in (img, label):
+            array = np.ascontiguousarray(array)
+            h.update(str((array.shape, array.dtype.str)).encode())
+            h.update(array.tobytes())
+        h.update(json.dumps(hparams, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".pth")
+
+    def _meta_path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def get(self, key):
+        import torch
+
+        path = self._path(key)
+        try:
+            state_dict = torch.load(path, map_location="cpu")
+            os.utime(path)
+        except (OSError, RuntimeError):
+            return None
+        return state_dict
+
+    def put(self, key, state_dict, hparams=None):
+        """Store `state_dict` under `key`, with the `hparams` it was trained with if given."""
+        import torch
+
+        path = self._path(key)
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        if hparams is not None:
+            with open(tmp_path, "w") as f:
+                json.dump(hparams, f, sort_keys=True, default=str)
+            os.replace(tmp_path, self._meta_path(key))
+        torch.save({k: v.detach().cpu() for k, v in state_dict.items()}, tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._evict()
+
+    def lineage(self, key):
+        """Hyperparameters of `key` and of each network it was warm-started from, newest first.
+
+        The chain ends at a network fine-tuned from the parent model, or early if a
+        record has been evicted.
+        """
+        chain = []
+        while key is not None:
+            try:
+                with open(self._meta_path(key)) as f:
+                    hparams = json.load(f)
+            except (OSError, ValueError):
+                break
+            chain.append(dict(hparams, key=key))
+            key = hparams.get("init")
+        return chain
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".pth"):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            try:
+                os.remove(path[: -len(".pth")] + ".json")
+            except OSError:
+                pass
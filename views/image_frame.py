@@ -0,0 +1,53 @@
+from PyQt6 import QtGui, QtWidgets
+import numpy as np
+
+
+def wrap_image(buffer: np.ndarray, format: QtGui.QImage.Format) -> QtGui.QImage:
+    """A QImage over `buffer`'s memory, without copying. The caller keeps `buffer` alive."""
+    height, width = buffer.shape[:2]
+    return QtGui.QImage(buffer.data, width, height, buffer.strides[0], format)
+
+
+class ImageFrame(QtWidgets.QLabel):
+    """Shows the video frame with the label overlay composited over it by Qt.
+
+    Each layer is a QImage over one of the renderer's long-lived buffers, wrapped again
+    only when the renderer reallocates it (on resize). A render or an alpha change only
+    repaints: the video layer is never copied or converted.
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._buffers = {}
+        self._layers = {}
+        self._label_opacity = 0.5
+
+    def _set_layer(self, name, buffer: np.ndarray, format: QtGui.QImage.Format):
+        if self._buffers.get(name) is not buffer:
+            self._buffers[name] = buffer
+            self._layers[name] = wrap_image(buffer, format)
+        self.update()
+
+    def set_image_layer(self, buffer: np.ndarray):
+        # (H, W, 3) RGB
+        self._set_layer("image", buffer, QtGui.QImage.Format.Format_RGB888)
+
+    def set_label_layer(self, buffer: np.ndarray):
+        # (H, W, 4) premultiplied RGBA, transparent where nothing is drawn
+        self._set_layer("label", buffer, QtGui.QImage.Format.Format_RGBA8888_Premultiplied)
+
+    def set_label_opacity(self, opacity: float):
+        self._label_opacity = opacity
+        self.update()
+
+    def paintEvent(self, event):
+        if "image" not in self._layers:
+            super().paintEvent(event)
+            return
+
+        painter = QtGui.QPainter(self)
+        painter.drawImage(0, 0, self._layers["image"])
+        if "label" in self._layers:
+            painter.setOpacity(self._label_opacity)
+            painter.drawImage(0, 0, self._layers["label"])
+        painter.end()
@@ -1,9 +1,10 @@
-from PyQt6 import QtWidgets, QtCore, QtGui
+from PyQt6 import QtWidgets, QtCore
 from views.main_view_ui import Ui_MainWindow
 import numpy as np
 from views.run_view import RunView
 from controllers.render import RenderInput
 import controllers.tools as tools 
+from models.label_volume import LabelVolume
 
 from typing import TYPE_CHECKING
 
@@ -53,7 +54,8 @@ class MainView(QtWidgets.QMainWindow):
         self._ui.label2.clicked.connect(lambda: self._main_controller.change_label(2))
 
         # listen for model event signals
-        self._model.image_frame_changed.connect(self.on_image_frame_changed)
+        self._model.image_layer_changed.connect(self._ui.image_frame.set_image_layer)
+        self._model.label_layer_changed.connect(self._ui.image_frame.set_label_layer)
         self._model.frame_num_changed.connect(self.on_frame_num_changed)
         self._model.zoom_ratio_changed.connect(self.on_zoom_ratio_changed)
         self._model.tool_name_changed.connect(self.on_tool_name_changed)
@@ -64,7 +66,7 @@ class MainView(QtWidgets.QMainWindow):
 
         # defaults TODO: make better
         video_data = np.array([[[[i, 255 - (i + j) // 2, j ] for i in range(0, 255)] for j in range(0, 255)]]) # FUN
-        self._model.video_label = np.zeros((video_data.shape[0], video_data.shape[1], video_data.shape[2]))
+        self._model.video_label = LabelVolume(video_data.shape[0], video_data.shape[1], video_data.shape[2])
         self._model.video_data = video_data
         self._model.frame_num = 0
         self._model.zoom_ratio = 1
@@ -76,9 +78,9 @@ class MainView(QtWidgets.QMainWindow):
 
         # connect model to controller
         self._main_controller.render([RenderInput.ROOT])
-        self._model.frame_num_changed.connect(lambda: self._main_controller.render([RenderInput.ROOT]))
-        self._model.zoom_ratio_changed.connect(lambda: self._main_controller.render([RenderInput.IMAGE_ZOOM, RenderInput.LABEL_ZOOM]))
-        self._model.coordinates_changed.connect(lambda: self._main_controller.render([RenderInput.IMAGE_MOVE_AND_APPLY, RenderInput.LABEL_MOVE_AND_APPLY]))
+        self._model.frame_num_changed.connect(lambda: self._main_controller.render([RenderInput.IMAGE_INITIAL, RenderInput.LABEL_INITIAL]))
+        self._model.zoom_ratio_changed.connect(lambda: self._main_controller.render([RenderInput.VIEWPORT]))
+        self._model.coordinates_changed.connect(lambda: self._main_controller.render([RenderInput.VIEWPORT]))
         self._model.video_label_changed.connect(lambda: self._main_controller.render([RenderInput.LABEL_INITIAL]))
         self._model.video_polygon_label_changed.connect(lambda: self._main_controller.render([RenderInput.LABEL_ZOOM]))
 
@@ -92,14 +94,6 @@ class MainView(QtWidgets.QMainWindow):
         else:
             self._ui.is_key_frame.setStyleSheet("background: #e74c3c; border-radius:5px; color: #ecf0f1")
 
-    @QtCore.pyqtSlot(np.ndarray)
-    def on_image_frame_changed(self, value: np.ndarray):
-        height = value.shape[0]
-        total_bytes = value.nbytes
-        bytes_per_line = int(total_bytes/height)
-        qimage = QtGui.QImage(value.data, value.shape[1], value.shape[0], bytes_per_line, QtGui.QImage.Format.Format_RGB888).rgbSwapped()
-        self._ui.image_frame.setPixmap(QtGui.QPixmap.fromImage(qimage))
-
     @QtCore.pyqtSlot(int)
     def on_frame_num_changed(self, frame_num: int):
         max_frame_num = self._model.video_data.shape[0] - 1
@@ -138,7 +132,7 @@ class MainView(QtWidgets.QMainWindow):
     @QtCore.pyqtSlot(int)
     def on_alpha_changed(self, alpha: int):
         self._ui.alpha.setText(f"Alpha: {alpha} %")
-        self._main_controller.render([RenderInput.LABEL_MOVE_AND_APPLY])
+        self._ui.image_frame.set_label_opacity(alpha / 100)
     
     @QtCore.pyqtSlot(int)
     def on_selected_label_changed(self, new_label: int):
@@ -1,5 +1,6 @@
 from PyQt6 import QtCore, QtGui, QtWidgets
 from PyQt6.QtWidgets import QMainWindow
+from views.image_frame import ImageFrame
 
 
 class Ui_MainWindow(object):
@@ -71,7 +72,7 @@ class Ui_MainWindow(object):
         self.video_ctrl_hlayout.addWidget(self.zoomout)
 
     def setup_image_frame(self):
-        self.image_frame = QtWidgets.QLabel("image", self.central_widget)
+        self.image_frame = ImageFrame("image", self.central_widget)
         self.image_frame.setObjectName("image_frame")
         self.center_vlayout.addWidget(self.image_frame)
         self.image_frame.setAlignment(QtCore.Qt.AlignmentFlag.AlignTop)
@@ -1,9 +1,9 @@
 from PyQt6 import QtWidgets, QtCore, QtGui
 from views.run_view_ui import Ui_RunWindow, AlgorithmsEnum
+from controllers.optical_flow import FLOW_ENGINES, FLOW_SCALES
+from osvos.schedule import DEFAULT_SCHEDULE, SCHEDULES
 import cv2
-import numpy as np
 from typing import TYPE_CHECKING
-import time
 
 if TYPE_CHECKING:
     from controllers.main_ctrl import MainController
@@ -21,6 +21,8 @@ class RunView(QtWidgets.QMainWindow):
         self._ui.setupUi(self)
 
         self._model.run__selected_frames = set()
+        self._thumbnails = self._main_controller.thumbnails((128, 128))
+        self._shown_selected_frames = set()
 
         key_frames = self._model.key_frames
         for i, frame in enumerate(self._ui.frames):
@@ -28,13 +30,32 @@ class RunView(QtWidgets.QMainWindow):
             if i not in key_frames:
                 frame.mousePressEvent = lambda e, i=i: self._main_controller.on_frame_clicked(i)
         
+        self._ui.flow_engine.addItems(list(FLOW_ENGINES))
+        self._ui.flow_scale.addItems(list(FLOW_SCALES))
+        self._ui.osvos_schedule.addItems(list(SCHEDULES))
+        self._ui.osvos_schedule.setCurrentText(DEFAULT_SCHEDULE)
+        # imported here: it loads torch, which the main window does not need
+        from osvos.export import DEFAULT_EXPORT, EXPORTS
+        self._ui.osvos_export.addItems(list(EXPORTS))
+        self._ui.osvos_export.setCurrentText(self._main_controller.osvos_export or DEFAULT_EXPORT)
+        self.on_flow_engine_changed(self._ui.flow_engine.currentText())
+        self.on_generate_algo_changed(self._ui.generate_algo.currentText())
+
         self._model.run__selected_frames_changed.connect(self.on_run__selected_frames_changed)
         self._ui.generate_algo.currentTextChanged.connect(self.validate_run_button)
+        self._ui.generate_algo.currentTextChanged.connect(self.on_generate_algo_changed)
+        self._ui.flow_engine.currentTextChanged.connect(self.on_flow_engine_changed)
         self._ui.run_button.clicked.connect(self.on_run_button_clicked)
+        self._main_controller.job_refused.connect(self.on_job_refused)
+
+    def closeEvent(self, event):
+        if self.is_open:
+            self._main_controller.job_refused.disconnect(self.on_job_refused)
+            self.is_open = False
+        super().closeEvent(event)
 
     def apply_frame(self, frame_obj, i):
-        v = self._model.video_data[i]
-        v = cv2.resize(v.astype(np.uint8), (128, 128))
+        v = self._thumbnails[i].copy()
         key_frames = self._model.key_frames
         selected_frames = self._model.run__selected_frames
         if i in key_frames:
@@ -47,10 +68,30 @@ class RunView(QtWidgets.QMainWindow):
         qimage = QtGui.QImage(v, v.shape[1], v.shape[0], bytes_per_line, QtGui.QImage.Format.Format_RGB888).rgbSwapped()
         frame_obj.setPixmap(QtGui.QPixmap.fromImage(qimage))
 
+    @QtCore.pyqtSlot(str)
+    def on_generate_algo_changed(self, algo: str):
+        is_flow = algo == AlgorithmsEnum.OPTICAL_FLOW
+        for combo in (self._ui.flow_engine, self._ui.flow_preset, self._ui.flow_scale):
+            combo.setVisible(is_flow)
+        self._ui.osvos_schedule.setVisible(algo == AlgorithmsEnum.OSVOS)
+        self._ui.osvos_warm_start.setVisible(algo == AlgorithmsEnum.OSVOS)
+        self._ui.osvos_export.setVisible(algo == AlgorithmsEnum.OSVOS)
+
+    @QtCore.pyqtSlot(str)
+    def on_flow_engine_changed(self, engine_name: str):
+        self._ui.flow_preset.clear()
+        self._ui.flow_preset.addItems(list(FLOW_ENGINES[engine_name]))
+
+    def selected_flow_engine(self):
+        engine = FLOW_ENGINES[self._ui.flow_engine.currentText()][self._ui.flow_preset.currentText()]
+        return engine.scaled(FLOW_SCALES[self._ui.flow_scale.currentText()])
+
     @QtCore.pyqtSlot(set)
-    def on_run__selected_frames_changed(self):
-        for i, frame in enumerate(self._ui.frames):
-            self.apply_frame(frame, i)
+    def on_run__selected_frames_changed(self, selected_frames: set):
+        # only the frames whose border changes are redrawn
+        for i in selected_frames ^ self._shown_selected_frames:
+            self.apply_frame(self._ui.frames[i], i)
+        self._shown_selected_frames = set(selected_frames)
         self.validate_run_button()
 
     def validate_run_button(self):
@@ -75,12 +116,52 @@ class RunView(QtWidgets.QMainWindow):
 
     def on_run_button_clicked(self):
         algo = self._ui.generate_algo.currentText()
-        pbar = self._ui.pbar
 
+        job = None
         if algo == AlgorithmsEnum.OPTICAL_FLOW:
-            self._main_controller.run_optical_flow(pbar)
+            job = self._main_controller.run_optical_flow(self.selected_flow_engine())
         elif algo == AlgorithmsEnum.OSVOS:
-            self._main_controller.run_osvos(pbar)
-        
-        time.sleep(1)
-        self.close()
+            self._main_controller.osvos_export = self._ui.osvos_export.currentText()
+            job = self._main_controller.run_osvos(
+                SCHEDULES[self._ui.osvos_schedule.currentText()], self._ui.osvos_warm_start.isChecked()
+            )
+        if job is None:
+            return
+
+        self._job = job
+        self._job_failed = False
+        self._ui.pbar.setValue(0)
+        self._ui.eta.setText("")
+        job.progress.connect(self.on_job_progress)
+        job.failed.connect(self.on_job_failed)
+        job.finished.connect(self.on_job_finished)
+        self._ui.cancel_button.clicked.connect(job.cancel)
+        self._ui.run_button.setEnabled(False)
+        self._ui.cancel_button.setEnabled(True)
+
+    @QtCore.pyqtSlot(int, float)
+    def on_job_progress(self, percent: int, eta: float):
+        self._ui.pbar.setValue(percent)
+        if eta == eta:  # NaN until the first report
+            self._ui.eta.setText(f"ETA {int(eta) // 60}:{int(eta) % 60:02d}")
+
+    @QtCore.pyqtSlot(str)
+    def on_job_refused(self, message: str):
+        QtWidgets.QMessageBox.warning(self, "Cannot run", message)
+
+    @QtCore.pyqtSlot(str)
+    def on_job_failed(self, message: str):
+        # set before the dialog: `finished` is delivered while it is open
+        self._job_failed = True
+        QtWidgets.QMessageBox.critical(self, "Propagation failed", message)
+
+    @QtCore.pyqtSlot()
+    def on_job_finished(self):
+        self._ui.cancel_button.clicked.disconnect(self._job.cancel)
+        if not (self._job_failed or self._job.cancelled):
+            self.close()
+            return
+        # stay open after a failure or cancel, so the run can be adjusted and retried
+        self._ui.cancel_button.setEnabled(False)
+        self._ui.eta.setText("Failed" if self._job_failed else "Cancelled")
+        self.validate_run_button()
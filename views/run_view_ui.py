@@ -23,15 +23,50 @@ class Ui_RunWindow(object):
         self.generate_algo.addItems(['-', AlgorithmsEnum.OPTICAL_FLOW, AlgorithmsEnum.OSVOS])
         self.top_layout.addWidget(self.generate_algo)
 
+        self.flow_engine = QtWidgets.QComboBox(self.central_widget)
+        self.flow_engine.setObjectName("flow_engine")
+        self.top_layout.addWidget(self.flow_engine)
+
+        self.flow_preset = QtWidgets.QComboBox(self.central_widget)
+        self.flow_preset.setObjectName("flow_preset")
+        self.top_layout.addWidget(self.flow_preset)
+
+        self.flow_scale = QtWidgets.QComboBox(self.central_widget)
+        self.flow_scale.setObjectName("flow_scale")
+        self.top_layout.addWidget(self.flow_scale)
+
+        self.osvos_schedule = QtWidgets.QComboBox(self.central_widget)
+        self.osvos_schedule.setObjectName("osvos_schedule")
+        self.top_layout.addWidget(self.osvos_schedule)
+
+        self.osvos_warm_start = QtWidgets.QCheckBox("Warm start", self.central_widget)
+        self.osvos_warm_start.setObjectName("osvos_warm_start")
+        self.osvos_warm_start.setToolTip("Start from the nearest key frame already fine-tuned, with a shorter schedule")
+        self.top_layout.addWidget(self.osvos_warm_start)
+
+        self.osvos_export = QtWidgets.QComboBox(self.central_widget)
+        self.osvos_export.setObjectName("osvos_export")
+        self.osvos_export.setToolTip("How the fine-tuned network is compiled for inference")
+        self.top_layout.addWidget(self.osvos_export)
+
         self.run_button = QtWidgets.QPushButton("Run", self.central_widget)
         self.run_button.setFixedSize(QtCore.QSize(64, 24))
         self.run_button.setEnabled(False)
         self.top_layout.addWidget(self.run_button)
 
+        self.cancel_button = QtWidgets.QPushButton("Cancel", self.central_widget)
+        self.cancel_button.setFixedSize(QtCore.QSize(64, 24))
+        self.cancel_button.setEnabled(False)
+        self.top_layout.addWidget(self.cancel_button)
+
         self.pbar = QtWidgets.QProgressBar(self.central_widget)
         self.pbar.setObjectName("pbar")
         self.pbar.setValue(0)
         self.top_layout.addWidget(self.pbar)
+
+        self.eta = QtWidgets.QLabel("", self.central_widget)
+        self.eta.setObjectName("eta")
+        self.top_layout.addWidget(self.eta)
     
     def setup_scroll(self):
         self.scrollArea = QtWidgets.QScrollArea(self.central_widget)